@@ -80,12 +80,12 @@ def kgsolver(steps, u_0, du_0, F=lambda u : -1 * u ** 3, monitor=None):
             factor = (1 / dt ** 2 - 1 / 4.0 * (-k2) + 1 / 4.0)
             return 1.0 / factor * v
 
-        u_k_n = ( u_k_n_1.c2r()
-                         .apply(lambda x, v: F(v), out=Ellipsis)
-                         .r2c(out=Ellipsis)
-                - u_k_n_1.apply(transfer_n_1, out=None)
-                ).apply(transfer_n, out=Ellipsis) \
-                - u_k_n_2
+        u_k_n = u_k_n_1.c2r() \
+                       .apply(lambda x, v: F(v), out=Ellipsis) \
+                       .r2c(out=Ellipsis)
+        # evaluate the differences into u_k_n without temporaries
+        (u_k_n.lazy() - u_k_n_1.apply(transfer_n_1)).compute(out=u_k_n)
+        (u_k_n.apply(transfer_n, out=Ellipsis).lazy() - u_k_n_2).compute(out=u_k_n)
 
         if monitor:
             monitor(t, dt, u_k_n_1, (u_k_n - u_k_n_1) / dt)
@@ -211,10 +211,8 @@ def force(pm, Q, S):
     #rhok.apply(CompensateTSCAliasing, kind='circular', out=Ellipsis)
 
     #print(fac, rhok.cgetitem([0, 0, 0]), rhok.cgetitem([1, 1, 1]))
-    F = numpy.empty_like(Q)
-    for d in range(pm.ndim):
-        F[..., d] = rhok.apply(force_transfer(d)) \
-                  .c2r().readout(X, layout=layout)
+    forces = [rhok.apply(force_transfer(d)).c2r() for d in range(pm.ndim)]
+    F = pm.readout_many(forces, X, layout=layout)
     return 1.5 * pt.Om0 * F
 
 def energy(pm, Q, S, V, a):
@@ -227,9 +225,9 @@ def energy(pm, Q, S, V, a):
     fac = 1.0 * pm.Nmesh.prod() / N
     rho1[...] *= fac
     rhok1 = rho1.r2c()
-    phi = rhok1.apply(pot_transfer) \
-              .apply(lowpass_transfer(pm.BoxSize[0] / pm.Nmesh[0] * 4)) \
-              .c2r().readout(X, layout=layout)
+    phi = rhok1.pipe(pot_transfer,
+                     lowpass_transfer(pm.BoxSize[0] / pm.Nmesh[0] * 4),
+                     out=pm.create(type='real')).readout(X, layout=layout)
 
     U = 1.5 * pt.Om0 * pm.comm.allreduce(phi.sum() / a)
 
@@ -2,6 +2,9 @@ import cython
 cimport cython
 import numpy
 cimport numpy
+from cython.parallel cimport prange, parallel, threadid
+from libc.stdlib cimport malloc, free
+from libc.math cimport floor
 
 ctypedef fused postype:
     cython.double
@@ -15,6 +18,10 @@ ctypedef fused hsmltype:
     cython.double
     cython.float
 
+ctypedef fused ktype:
+    cython.double
+    cython.float
+
 cdef extern from "_window_imp.h":
 
     ctypedef enum PMeshPainterType:
@@ -58,11 +65,377 @@ cdef extern from "_window_imp.h":
         int canvas_dtype_elsize
         ptrdiff_t size[32]
         ptrdiff_t strides[32]
+        int nfields
+        void * canvases[32]
 
     void pmesh_painter_init(PMeshPainter * painter)
-    void pmesh_painter_paint(PMeshPainter * painter, double pos[], double mass, double hsml)
-    double pmesh_painter_readout(PMeshPainter * painter, double pos[], double hsml)
+    void pmesh_painter_paint(PMeshPainter * painter, double pos[], double mass[], double hsml) nogil
+    void pmesh_painter_readout(PMeshPainter * painter, double pos[], double value[], double hsml) nogil
+    void pmesh_painter_paint_many(PMeshPainter * painter, int n, double pos[], double weight[], double hsml[]) nogil
+    void pmesh_painter_readout_many(PMeshPainter * painter, int n, double pos[], double value[], double hsml[]) nogil
     double pmesh_painter_get_fwindow(PMeshPainter * painter, double w)
+    int pmesh_painter_fill(PMeshPainter * painter, double pos[], double hsml, int ipos[], double k[]) nogil
+    void pmesh_painter_paint_k(PMeshPainter * painter, int ipos[], double k[], int support, double weight[]) nogil
+    void pmesh_painter_readout_k(PMeshPainter * painter, int ipos[], double k[], int support, double value[]) nogil
+
+# particles are handed to the painter in chunks of CHUNK
+cdef enum:
+    CHUNK = 16
+
+cdef inline double * _alloc_chunk() noexcept nogil:
+    # CHUNK * 32 coordinates, CHUNK * 32 weights or values and CHUNK smoothing lengths.
+    return <double*> malloc(sizeof(double) * CHUNK * 65)
+
+cdef inline void _paint_chunk(PMeshPainter * painter, double * x,
+        const postype [:, :] pos, const hsmltype [:] hsml, const masstype [:, :] mass, int has_hsml,
+        const ptrdiff_t * index, ptrdiff_t start, int n) noexcept nogil:
+    # paints particles start ... start + n, or index[start] ... index[start + n] if index is not NULL.
+    cdef int j, d
+    cdef ptrdiff_t i
+    cdef int ndim = painter.ndim
+    cdef int nfields = painter.nfields
+    cdef double * p = x
+    cdef double * w = x + CHUNK * 32
+    cdef double * h = x + CHUNK * 64
+    for j in range(n):
+        if index != NULL:
+            i = index[start + j]
+        else:
+            i = start + j
+        for d in range(ndim):
+            p[j * ndim + d] = pos[i, d]
+        for d in range(nfields):
+            w[j * nfields + d] = mass[i, d]
+        if has_hsml:
+            h[j] = hsml[i]
+    if not has_hsml:
+        h = NULL
+    pmesh_painter_paint_many(painter, n, p, w, h)
+
+cdef inline void _readout_chunk(PMeshPainter * painter, double * x,
+        const postype [:, :] pos, const hsmltype [:] hsml, masstype [:, :] out, int has_hsml,
+        const ptrdiff_t * index, ptrdiff_t start, int n) noexcept nogil:
+    cdef int j, d
+    cdef ptrdiff_t i
+    cdef int ndim = painter.ndim
+    cdef int nfields = painter.nfields
+    cdef double * p = x
+    cdef double * v = x + CHUNK * 32
+    cdef double * h = x + CHUNK * 64
+    for j in range(n):
+        if index != NULL:
+            i = index[start + j]
+        else:
+            i = start + j
+        for d in range(ndim):
+            p[j * ndim + d] = pos[i, d]
+        if has_hsml:
+            h[j] = hsml[i]
+    if not has_hsml:
+        h = NULL
+    pmesh_painter_readout_many(painter, n, p, v, h)
+    for j in range(n):
+        if index != NULL:
+            i = index[start + j]
+        else:
+            i = start + j
+        for d in range(nfields):
+            out[i, d] = v[j * nfields + d]
+
+cdef inline void _load_k(double * k, const int [:, ::1] ipos, int * ip, const ktype [:, :, ::1] k0, const ktype [:, :, ::1] k1,
+        int diffdir, ptrdiff_t i) noexcept nogil:
+    # assemble the weights of particle i; axis diffdir uses the derivative weights.
+    cdef int d, j
+    cdef int S = k0.shape[2]
+    for d in range(ipos.shape[1]):
+        ip[d] = ipos[i, d]
+        if d == diffdir:
+            for j in range(S):
+                k[d * S + j] = k1[i, d, j]
+        else:
+            for j in range(S):
+                k[d * S + j] = k0[i, d, j]
+
+cdef _paint_private(list reals, PMeshPainter * painter, const postype [:, :] pos, const hsmltype [:] hsml, const masstype [:, :] mass,
+        int nthreads, const ptrdiff_t * index, ptrdiff_t N):
+    """ Each thread paints to a private copy of the canvases; the copies are
+        reduced to reals at the end. Uses nthreads times the memory of reals.
+    """
+    cdef double * x
+    cdef PMeshPainter * mypainter
+    cdef ptrdiff_t c
+    cdef int d, f
+    cdef ptrdiff_t nchunks = (N + CHUNK - 1) // CHUNK
+    cdef int has_hsml = hsml is not None
+    cdef int nfields = len(reals)
+
+    real = reals[0]
+    canvases = numpy.zeros((nthreads, nfields) + real.shape, dtype=real.dtype)
+
+    cdef char * base = <char*> (<numpy.ndarray> canvases).data
+    cdef ptrdiff_t cstride = canvases.strides[0]
+    cdef ptrdiff_t fstride = canvases.strides[1]
+    cdef ptrdiff_t strides[32]
+    for d in range(painter[0].ndim):
+        strides[d] = canvases.strides[d + 2]
+
+    with nogil, parallel(num_threads=nthreads):
+        x = _alloc_chunk()
+        mypainter = <PMeshPainter*> malloc(sizeof(PMeshPainter))
+        mypainter[0] = painter[0]
+        for f in range(nfields):
+            mypainter.canvases[f] = <void*> (base + threadid() * cstride + f * fstride)
+        mypainter.canvas = mypainter.canvases[0]
+        for d in range(mypainter.ndim):
+            mypainter.strides[d] = strides[d]
+
+        for c in prange(nchunks, schedule='static'):
+            _paint_chunk(mypainter, x, pos, hsml, mass, has_hsml, index,
+                    c * CHUNK, min(CHUNK, N - c * CHUNK))
+
+        free(mypainter)
+        free(x)
+
+    for f in range(nfields):
+        reals[f][...] += canvases[:, f].sum(axis=0)
+
+@cython.cdivision(True)
+cdef int _paint_tiled(PMeshPainter * painter, const postype [:, :] pos, const hsmltype [:] hsml, const masstype [:, :] mass,
+        int nthreads, double hsmlmax, const ptrdiff_t * subset, ptrdiff_t N) except -1:
+    """ Owner computes: the canvas is cut into tiles along the first axis,
+        wide enough that particles binned to tile t never write beyond
+        tiles t - 1 and t + 1. Even tiles are painted concurrently, then odd tiles.
+        Particles not binned to any tile are painted serially at the end.
+
+        Only the N particles in subset are painted, or the first N if subset is NULL.
+
+        Returns 0 if the canvas is too thin to be tiled.
+    """
+    cdef double * x
+    cdef ptrdiff_t i, j, c
+    cdef ptrdiff_t * pindex
+    cdef int t, color
+    cdef int has_hsml = hsml is not None
+
+    cdef ptrdiff_t size0 = painter[0].size[0]
+    cdef ptrdiff_t period0 = painter[0].Nmesh[0]
+    cdef double scale0 = painter[0].scale[0]
+    cdef double translate0 = painter[0].translate[0]
+
+    # a particle at cell c touches at most [c - reach, c + reach]
+    cdef ptrdiff_t reach = <ptrdiff_t> (painter[0].support * hsmlmax) + 2
+    cdef int T = size0 // (2 * reach + 1)
+    T -= T % 2
+    if T < 2:
+        return 0
+
+    cdef int [::1] tile = numpy.empty(N, dtype='i4')
+    cdef ptrdiff_t [::1] offset = numpy.zeros(T + 2, dtype='intp')
+    cdef ptrdiff_t [::1] index = numpy.empty(N, dtype='intp')
+
+    with nogil:
+        for j in range(N):
+            if subset != NULL:
+                i = subset[j]
+            else:
+                i = j
+            c = <ptrdiff_t> floor(pos[i, 0] * scale0 + translate0)
+            if period0 > 0:
+                c = c % period0
+                if c < 0: c = c + period0
+            if c >= 0 and c < size0:
+                tile[j] = ((c + 1) * T - 1) // size0
+            else:
+                # stragglers
+                tile[j] = T
+            offset[tile[j] + 1] += 1
+
+        for t in range(T + 1):
+            offset[t + 1] += offset[t]
+
+        for j in range(N):
+            if subset != NULL:
+                i = subset[j]
+            else:
+                i = j
+            index[offset[tile[j]]] = i
+            offset[tile[j]] += 1
+
+        for t in range(T, 0, -1):
+            offset[t] = offset[t - 1]
+        offset[0] = 0
+
+    pindex = &index[0]
+
+    with nogil, parallel(num_threads=nthreads):
+        x = _alloc_chunk()
+        for color in range(2):
+            for t in prange(color, T, 2, schedule='dynamic'):
+                j = offset[t]
+                while j < offset[t + 1]:
+                    _paint_chunk(painter, x, pos, hsml, mass, has_hsml, pindex,
+                        j, min(CHUNK, offset[t + 1] - j))
+                    j = j + CHUNK
+        free(x)
+
+    with nogil:
+        x = _alloc_chunk()
+        j = offset[T]
+        while j < offset[T + 1]:
+            _paint_chunk(painter, x, pos, hsml, mass, has_hsml, pindex,
+                j, min(CHUNK, offset[T + 1] - j))
+            j += CHUNK
+        free(x)
+
+    return 1
+
+cdef inline void _paint_k_range(PMeshPainter * painter, double * w, double * kk, int * ip,
+        const int [:, ::1] ipos, const ktype [:, :, ::1] k0, const ktype [:, :, ::1] k1, int diffdir,
+        const masstype [:, :] mass, const ptrdiff_t * index, ptrdiff_t start, ptrdiff_t end) noexcept nogil:
+    # replays particles start ... end, or index[start] ... index[end] if index is not NULL.
+    cdef ptrdiff_t i, j
+    cdef int f
+    cdef int S = k0.shape[2]
+    for j in range(start, end):
+        if index != NULL:
+            i = index[j]
+        else:
+            i = j
+        _load_k(kk, ipos, ip, k0, k1, diffdir, i)
+        for f in range(painter.nfields):
+            w[f] = mass[i, f]
+        pmesh_painter_paint_k(painter, ip, kk, S, w)
+
+cdef _plan_paint_private(list reals, PMeshPainter * painter,
+        const int [:, ::1] ipos, const ktype [:, :, ::1] k0, const ktype [:, :, ::1] k1, int diffdir,
+        const masstype [:, :] mass, int nthreads):
+    """ As _paint_private, replaying the weights of a plan. """
+    cdef double * w
+    cdef double * kk
+    cdef int * ip
+    cdef PMeshPainter * mypainter
+    cdef ptrdiff_t c
+    cdef int d, f
+    cdef ptrdiff_t N = ipos.shape[0]
+    cdef ptrdiff_t nchunks = (N + CHUNK - 1) // CHUNK
+    cdef int S = k0.shape[2]
+    cdef int nfields = len(reals)
+
+    real = reals[0]
+    canvases = numpy.zeros((nthreads, nfields) + real.shape, dtype=real.dtype)
+
+    cdef char * base = <char*> (<numpy.ndarray> canvases).data
+    cdef ptrdiff_t cstride = canvases.strides[0]
+    cdef ptrdiff_t fstride = canvases.strides[1]
+    cdef ptrdiff_t strides[32]
+    for d in range(painter[0].ndim):
+        strides[d] = canvases.strides[d + 2]
+
+    with nogil, parallel(num_threads=nthreads):
+        w = <double*> malloc(sizeof(double) * 32)
+        kk = <double*> malloc(sizeof(double) * 32 * S)
+        ip = <int*> malloc(sizeof(int) * 32)
+        mypainter = <PMeshPainter*> malloc(sizeof(PMeshPainter))
+        mypainter[0] = painter[0]
+        for f in range(nfields):
+            mypainter.canvases[f] = <void*> (base + threadid() * cstride + f * fstride)
+        mypainter.canvas = mypainter.canvases[0]
+        for d in range(mypainter.ndim):
+            mypainter.strides[d] = strides[d]
+
+        for c in prange(nchunks, schedule='static'):
+            _paint_k_range(mypainter, w, kk, ip, ipos, k0, k1, diffdir, mass, NULL,
+                    c * CHUNK, min((c + 1) * CHUNK, N))
+
+        free(mypainter)
+        free(ip)
+        free(kk)
+        free(w)
+
+    for f in range(nfields):
+        reals[f][...] += canvases[:, f].sum(axis=0)
+
+@cython.cdivision(True)
+cdef int _plan_paint_tiled(PMeshPainter * painter,
+        const int [:, ::1] ipos, const ktype [:, :, ::1] k0, const ktype [:, :, ::1] k1, int diffdir,
+        const masstype [:, :] mass, int nthreads) except -1:
+    """ As _paint_tiled, replaying the weights of a plan. The particles are binned
+        by their left most cell along the first axis, from which they touch S cells.
+
+        Returns 0 if the canvas is too thin to be tiled.
+    """
+    cdef double * w
+    cdef double * kk
+    cdef int * ip
+    cdef ptrdiff_t i, j, c
+    cdef ptrdiff_t * pindex
+    cdef int t, color
+    cdef ptrdiff_t N = ipos.shape[0]
+    cdef int S = k0.shape[2]
+
+    cdef ptrdiff_t size0 = painter[0].size[0]
+    cdef ptrdiff_t period0 = painter[0].Nmesh[0]
+
+    # a particle at cell c touches [c, c + S - 1]
+    cdef ptrdiff_t reach = S + 1
+    cdef int T = size0 // (2 * reach + 1)
+    T -= T % 2
+    if T < 2:
+        return 0
+
+    cdef int [::1] tile = numpy.empty(N, dtype='i4')
+    cdef ptrdiff_t [::1] offset = numpy.zeros(T + 2, dtype='intp')
+    cdef ptrdiff_t [::1] index = numpy.empty(N, dtype='intp')
+
+    with nogil:
+        for i in range(N):
+            c = ipos[i, 0]
+            if period0 > 0:
+                c = c % period0
+                if c < 0: c = c + period0
+            if c >= 0 and c < size0:
+                tile[i] = ((c + 1) * T - 1) // size0
+            else:
+                # stragglers
+                tile[i] = T
+            offset[tile[i] + 1] += 1
+
+        for t in range(T + 1):
+            offset[t + 1] += offset[t]
+
+        for i in range(N):
+            index[offset[tile[i]]] = i
+            offset[tile[i]] += 1
+
+        for t in range(T, 0, -1):
+            offset[t] = offset[t - 1]
+        offset[0] = 0
+
+    pindex = &index[0]
+
+    with nogil, parallel(num_threads=nthreads):
+        w = <double*> malloc(sizeof(double) * 32)
+        kk = <double*> malloc(sizeof(double) * 32 * S)
+        ip = <int*> malloc(sizeof(int) * 32)
+        for color in range(2):
+            for t in prange(color, T, 2, schedule='dynamic'):
+                _paint_k_range(painter, w, kk, ip, ipos, k0, k1, diffdir, mass, pindex,
+                    offset[t], offset[t + 1])
+        free(ip)
+        free(kk)
+        free(w)
+
+    with nogil:
+        w = <double*> malloc(sizeof(double) * 32)
+        kk = <double*> malloc(sizeof(double) * 32 * S)
+        ip = <int*> malloc(sizeof(int) * 32)
+        _paint_k_range(painter, w, kk, ip, ipos, k0, k1, diffdir, mass, pindex,
+            offset[T], offset[T + 1])
+        free(ip)
+        free(kk)
+        free(w)
+
+    return 1
 
 cdef class ResampleWindow(object):
     cdef PMeshPainter painter[1]
@@ -115,7 +488,7 @@ cdef class ResampleWindow(object):
         self.support = self.painter.support
         self.kind = kind
 
-    def get_fwindow(self, double [:] w):
+    def get_fwindow(self, const double [:] w):
         cdef double [:] vrt
         cdef double v
         rt = numpy.zeros(w.shape[0], dtype='f8')
@@ -125,22 +498,42 @@ cdef class ResampleWindow(object):
             vrt[i] = v
         return rt
 
-    def paint(self, numpy.ndarray real, postype [:, :] pos, hsmltype [:] hsml, masstype [:] mass,
-            order, double [:] scale, double [:] translate, ptrdiff_t [:] period):
-        cdef double x[32]
-        cdef double m, h
-        cdef int d
-        cdef int i
+    cdef int _setup(self, PMeshPainter * painter, list reals,
+            order, const double [:] scale, const double [:] translate, const ptrdiff_t [:] period) except -1:
+        """ Set up painter for the canvases in reals. All canvases must share
+            dtype, shape and strides. If reals is None, only the transformation is set up.
+        """
+        cdef int d, f
 
-        assert real.dtype.kind == 'f'
+        painter[0] = self.painter[0]
 
-        cdef PMeshPainter painter[1]
+        if reals is None:
+            painter.ndim = scale.shape[0]
+            painter.canvas_dtype_elsize = 8
+            painter.nfields = 1
+            for d in range(painter.ndim):
+                painter.order[d] = order[d]
+                painter.Nmesh[d] = period[d]
+                painter.scale[d] = scale[d]
+                painter.translate[d] = translate[d]
+            pmesh_painter_init(painter)
+            return 0
 
-        painter[0] = self.painter[0]
+        cdef numpy.ndarray real = reals[0]
+
+        assert real.dtype.kind == 'f'
+        assert 0 < len(reals) <= 32
 
         painter.ndim = real.ndim
         painter.canvas = <void*> real.data
         painter.canvas_dtype_elsize = real.dtype.itemsize
+        painter.nfields = len(reals)
+        for f in range(painter.nfields):
+            other = reals[f]
+            assert other.dtype == real.dtype
+            assert other.shape == (<object> real).shape
+            assert other.strides == (<object> real).strides
+            painter.canvases[f] = <void*> (<numpy.ndarray> other).data
 
         for d in range(painter.ndim):
             painter.order[d] = order[d]
@@ -153,54 +546,206 @@ cdef class ResampleWindow(object):
             painter.strides[d] = real.strides[d]
 
         pmesh_painter_init(painter)
+        return 0
+
+    def paint(self, list reals, const postype [:, :] pos, const hsmltype [:] hsml, const masstype [:, :] mass,
+            order, const double [:] scale, const double [:] translate, const ptrdiff_t [:] period,
+            int nthreads=1, strategy='tile', double hsmlmax=1.0, const ptrdiff_t [::1] index=None):
+        """ Paint mass[:, f] to reals[f]; the kernel is evaluated once per particle.
+            If index is given, only the particles in index are painted.
+        """
+        cdef double * x
+        cdef ptrdiff_t i
+        cdef ptrdiff_t N = pos.shape[0]
+        cdef const ptrdiff_t * pindex = NULL
+        cdef int has_hsml = hsml is not None
+
+        if index is not None:
+            N = index.shape[0]
+            if N > 0:
+                pindex = &index[0]
+
+        assert mass.shape[1] == len(reals)
 
-        for i in range(pos.shape[0]):
-            for d in range(painter.ndim):
-                x[d] = pos[i, d]
-            m = mass[i]
-            if hsml is not None:
-                h = hsml[i]
+        cdef PMeshPainter painter[1]
+
+        self._setup(painter, reals, order, scale, translate, period)
+
+        if nthreads > 1 and N > 0:
+            if strategy == 'private':
+                _paint_private(reals, painter, pos, hsml, mass, nthreads, pindex, N)
+                return
+            elif strategy == 'tile':
+                if _paint_tiled(painter, pos, hsml, mass, nthreads, hsmlmax, pindex, N):
+                    return
             else:
-                h = 1.0
-            pmesh_painter_paint(painter, x, m, h)
+                raise ValueError("strategy must be 'tile' or 'private'")
+
+        with nogil:
+            x = _alloc_chunk()
+            i = 0
+            while i < N:
+                _paint_chunk(painter, x, pos, hsml, mass, has_hsml, pindex,
+                    i, min(CHUNK, N - i))
+                i += CHUNK
+            free(x)
+
+    def readout(self, list reals, const postype [:, :] pos, const hsmltype [:] hsml, masstype [:, :] out, order,
+        const double [:] scale, const double [:] translate, const ptrdiff_t [:] period, int nthreads=1,
+        const ptrdiff_t [::1] index=None):
+        """ Read out reals[f] to out[:, f]; the kernel is evaluated once per particle.
+            If index is given, only the particles in index are read out.
+        """
+        cdef double * x
+        cdef ptrdiff_t c
+        cdef ptrdiff_t N = pos.shape[0]
+        cdef const ptrdiff_t * pindex = NULL
+        cdef int has_hsml = hsml is not None
+
+        if index is not None:
+            N = index.shape[0]
+            if N > 0:
+                pindex = &index[0]
+
+        cdef ptrdiff_t nchunks = (N + CHUNK - 1) // CHUNK
+
+        assert out.shape[1] == len(reals)
 
-    def readout(self, numpy.ndarray real, postype [:, :] pos, hsmltype [:] hsml, masstype [:] out, order,
-        double [:] scale, double [:] translate, ptrdiff_t [:] period):
+        cdef PMeshPainter painter[1]
 
-        cdef double x[32]
-        cdef ptrdiff_t strides[32]
-        cdef double m, h
-        cdef int d
-        cdef int i
+        self._setup(painter, reals, order, scale, translate, period)
 
-        assert real.dtype.kind == 'f'
+        # readouts never conflict; the GIL is released such that
+        # readouts from several python threads can run concurrently.
+        with nogil, parallel(num_threads=max(nthreads, 1)):
+            x = _alloc_chunk()
+            for c in prange(nchunks, schedule='static'):
+                _readout_chunk(painter, x, pos, hsml, out, has_hsml, pindex,
+                    c * CHUNK, min(CHUNK, N - c * CHUNK))
+            free(x)
 
+    def plan_support(self, double hsmlmax):
+        """ The number of cells along an axis touched by a particle of hsml up to hsmlmax. """
         cdef PMeshPainter painter[1]
-
+        cdef double x[32]
+        cdef int ipos[32]
+        cdef double k[32 * 32]
+        cdef int d
         painter[0] = self.painter[0]
+        painter.ndim = 1
+        painter.order[0] = 0
+        painter.scale[0] = 1.0
+        painter.translate[0] = 0.0
+        painter.Nmesh[0] = 0
+        painter.canvas_dtype_elsize = 8
+        pmesh_painter_init(painter)
+        x[0] = 0.0
+        return pmesh_painter_fill(painter, x, hsmlmax, ipos, k)
+
+    def plan_fill(self, const postype [:, :] pos, const hsmltype [:] hsml, int order,
+        const double [:] scale, const double [:] translate, const ptrdiff_t [:] period,
+        int [:, ::1] ipos, ktype [:, :, ::1] k, int nthreads=1):
+        """ Fill the base cell ipos and the 1d weights k of particles;
+            order is 0 for the kernel and 1 for its derivative.
+            k is padded with zeros for particles of smaller support.
+        """
+        cdef double * x
+        cdef double * kk
+        cdef int * ip
+        cdef int d, j, s
+        cdef ptrdiff_t i
+        cdef ptrdiff_t N = pos.shape[0]
+        cdef int S = k.shape[2]
+        cdef int has_hsml = hsml is not None
+        cdef double h = 1.0
 
-        painter.ndim = real.ndim
-        painter.canvas = <void*> real.data
-        painter.canvas_dtype_elsize = real.dtype.itemsize
+        cdef PMeshPainter painter[1]
 
-        for d in range(painter.ndim):
-            painter.order[d] = order[d]
-            painter.Nmesh[d] = period[d]
-            painter.scale[d] = scale[d]
-            painter.translate[d] = translate[d]
+        self._setup(painter, None, [order] * scale.shape[0], scale, translate, period)
+
+        with nogil, parallel(num_threads=max(nthreads, 1)):
+            x = <double*> malloc(sizeof(double) * 32)
+            kk = <double*> malloc(sizeof(double) * 32 * 32)
+            ip = <int*> malloc(sizeof(int) * 32)
+            for i in prange(N, schedule='static'):
+                for d in range(painter.ndim):
+                    x[d] = pos[i, d]
+                h = hsml[i] if has_hsml else 1.0
+                s = pmesh_painter_fill(painter, x, h, ip, kk)
+                for d in range(painter.ndim):
+                    ipos[i, d] = ip[d]
+                    for j in range(S):
+                        k[i, d, j] = kk[d * s + j] if j < s else 0
+            free(ip)
+            free(kk)
+            free(x)
+
+    def plan_paint(self, list reals, const int [:, ::1] ipos, const ktype [:, :, ::1] k0, const ktype [:, :, ::1] k1, int diffdir,
+            const masstype [:, :] mass, const double [:] scale, const double [:] translate, const ptrdiff_t [:] period,
+            int nthreads=1, strategy='tile'):
+        """ Paint mass[:, f] to reals[f] with the weights filled by plan_fill.
+            k1 (the derivative weights) is used along diffdir; diffdir < 0 for none.
+            nthreads and strategy are as in paint.
+        """
+        cdef double * w
+        cdef double * kk
+        cdef int * ip
+        cdef ptrdiff_t N = ipos.shape[0]
+        cdef int S = k0.shape[2]
+
+        assert mass.shape[1] == len(reals)
 
-        for d in range(painter.ndim):
-            painter.size[d] = real.shape[d]
-            painter.strides[d] = real.strides[d]
+        cdef PMeshPainter painter[1]
 
-        pmesh_painter_init(painter)
+        self._setup(painter, reals, [0] * scale.shape[0], scale, translate, period)
 
-        for i in range(pos.shape[0]):
-            for d in range(painter.ndim):
-                x[d] = pos[i, d]
-            if hsml is not None:
-                h = hsml[i]
+        if nthreads > 1 and N > 0:
+            if strategy == 'private':
+                _plan_paint_private(reals, painter, ipos, k0, k1, diffdir, mass, nthreads)
+                return
+            elif strategy == 'tile':
+                if _plan_paint_tiled(painter, ipos, k0, k1, diffdir, mass, nthreads):
+                    return
             else:
-                h = 1.0
-            out[i] = pmesh_painter_readout(painter, x, h)
+                raise ValueError("strategy must be 'tile' or 'private'")
+
+        with nogil:
+            w = <double*> malloc(sizeof(double) * 32)
+            kk = <double*> malloc(sizeof(double) * 32 * S)
+            ip = <int*> malloc(sizeof(int) * 32)
+            _paint_k_range(painter, w, kk, ip, ipos, k0, k1, diffdir, mass, NULL, 0, N)
+            free(ip)
+            free(kk)
+            free(w)
+
+    def plan_readout(self, list reals, const int [:, ::1] ipos, const ktype [:, :, ::1] k0, const ktype [:, :, ::1] k1, int diffdir,
+            masstype [:, :] out, const double [:] scale, const double [:] translate, const ptrdiff_t [:] period, int nthreads=1):
+        """ Read out reals[f] to out[:, f] with the weights filled by plan_fill.
+            k1 (the derivative weights) is used along diffdir; diffdir < 0 for none.
+        """
+        cdef double * v
+        cdef double * kk
+        cdef int * ip
+        cdef int f
+        cdef ptrdiff_t i
+        cdef ptrdiff_t N = ipos.shape[0]
+        cdef int S = k0.shape[2]
+
+        assert out.shape[1] == len(reals)
+
+        cdef PMeshPainter painter[1]
 
+        self._setup(painter, reals, [0] * scale.shape[0], scale, translate, period)
+
+        with nogil, parallel(num_threads=max(nthreads, 1)):
+            v = <double*> malloc(sizeof(double) * 32)
+            kk = <double*> malloc(sizeof(double) * 32 * S)
+            ip = <int*> malloc(sizeof(int) * 32)
+            for i in prange(N, schedule='static'):
+                _load_k(kk, ipos, ip, k0, k1, diffdir, i)
+                pmesh_painter_readout_k(painter, ip, kk, S, v)
+                for f in range(painter.nfields):
+                    out[i, f] = v[f]
+            free(ip)
+            free(kk)
+            free(v)
@@ -1,69 +1,224 @@
 #define UNLIKELY(x) (x)
 #define LIKELY(x) (x)
 
-static void
-mkname(_generic_paint) (PMeshPainter * painter, double pos[], double weight, double hsml)
+static inline void
+mkname(_scatter) (const PMeshPainter * const painter, const ptrdiff_t ind, const double kernel, const double weight[])
 {
-    PMeshWindowInfo window[1];
-    pmesh_window_info_init(window, painter->ndim, painter->nativesupport, painter->support * hsml);
-
-    /* Check for fast painting routines */
-    paintfunc fastpaint;
-    readoutfunc fastreadout;
-
-    if(painter->getfastmethod &&
-       painter->getfastmethod(painter, window, &fastpaint, &fastreadout)) {
+    int f;
+    for(f = 0; f < painter->nfields; f ++) {
+        * (FLOAT*) ((char*) painter->canvases[f] + ind) += weight[f] * kernel;
+    }
+}
 
-        fastpaint(painter, pos, weight, hsml);
-        return;
+static inline void
+mkname(_gather) (const PMeshPainter * const painter, const ptrdiff_t ind, const double kernel, double value[])
+{
+    int f;
+    for(f = 0; f < painter->nfields; f ++) {
+        value[f] += kernel * * (FLOAT*) ((char*) painter->canvases[f] + ind);
     }
+}
 
-    int ipos[painter->ndim];
+/* the last axis of the compacted cells is a contiguous line of the canvas. */
+static inline int
+mkname(_is_line) (const PMeshPainter * const painter, const ptrdiff_t o[], const int n)
+{
+    int l;
+    if(painter->strides[painter->ndim - 1] != (ptrdiff_t) sizeof(FLOAT)) return 0;
+    for(l = 1; l < n; l ++) {
+        if(o[l] - o[l - 1] != (ptrdiff_t) sizeof(FLOAT)) return 0;
+    }
+    return 1;
+}
 
-    /* the max support is 32 */
-    double k[painter->ndim * window->support];
+/* add w * k[l] to the cells o[l] of a canvas; contiguous lines get a plain loop. */
+static inline void
+mkname(_scatter_line) (char * base, const ptrdiff_t o[], const double k[], const int n, const double w, const int line)
+{
+    int l;
+    if(line) {
+        FLOAT * p = (FLOAT*) (base + o[0]);
+        for(l = 0; l < n; l ++) {
+            p[l] += w * k[l];
+        }
+    } else {
+        for(l = 0; l < n; l ++) {
+            * (FLOAT*) (base + o[l]) += w * k[l];
+        }
+    }
+}
 
-    char * canvas = (char*) painter->canvas;
+/* partial sum of k[l] times the cells o[l] of a canvas. */
+static inline double
+mkname(_gather_line) (const char * base, const ptrdiff_t o[], const double k[], const int n, const int line)
+{
+    int l;
+    double s = 0;
+    if(line) {
+        const FLOAT * p = (const FLOAT*) (base + o[0]);
+        for(l = 0; l < n; l ++) {
+            s += k[l] * p[l];
+        }
+    } else {
+        for(l = 0; l < n; l ++) {
+            s += k[l] * * (const FLOAT*) (base + o[l]);
+        }
+    }
+    return s;
+}
 
-    _fill_k(painter, window, pos, ipos, k);
+/* paint with the base cell ipos and the 1d kernel weights k[d * support + i] of a particle.
+ * The kernel tables are looked up ndim * support times per particle by _fill_k;
+ * the cells are wrapped per axis by _wrap_k, and the common dimensions are
+ * factorized along the fastest axis. */
+static void
+mkname(_generic_paint_k) (PMeshPainter * painter, int ipos[], double k[], int support, double weight[])
+{
+    ptrdiff_t off[painter->ndim * support];
+    double kk[painter->ndim * support];
+    int n[painter->ndim];
+
+    if(!_wrap_k(painter, ipos, k, support, off, kk, n)) return;
+
+    /* no atomics: the threaded drivers in _window.pyx never let two threads write the same cell. */
+    const ptrdiff_t * o0 = off;
+    const double * k0 = kk;
+    int i, j, f;
+    switch(painter->ndim) {
+        case 1:
+            for(i = 0; i < n[0]; i ++) {
+                mkname(_scatter)(painter, o0[i], k0[i], weight);
+            }
+        return;
+        /* outer product staging: the weight of a line is formed once,
+         * then spread along the fastest axis. */
+        case 2: {
+            const ptrdiff_t * o1 = off + support;
+            const double * k1 = kk + support;
+            const int line = mkname(_is_line)(painter, o1, n[1]);
+            for(f = 0; f < painter->nfields; f ++) {
+                char * base = (char*) painter->canvases[f];
+                for(i = 0; i < n[0]; i ++) {
+                    mkname(_scatter_line)(base + o0[i], o1, k1, n[1], weight[f] * k0[i], line);
+                }
+            }
+        }
+        return;
+        case 3: {
+            const ptrdiff_t * o1 = off + support;
+            const double * k1 = kk + support;
+            const ptrdiff_t * o2 = off + 2 * support;
+            const double * k2 = kk + 2 * support;
+            const int line = mkname(_is_line)(painter, o2, n[2]);
+            for(f = 0; f < painter->nfields; f ++) {
+                char * base = (char*) painter->canvases[f];
+                for(i = 0; i < n[0]; i ++) {
+                    const double wi = weight[f] * k0[i];
+                    for(j = 0; j < n[1]; j ++) {
+                        mkname(_scatter_line)(base + o0[i] + o1[j], o2, k2, n[2], wi * k1[j], line);
+                    }
+                }
+            }
+        }
+        return;
+    }
 
     int rel[painter->ndim];
     int d;
     for(d =0; d < painter->ndim; d ++ ) rel[d] = 0;
 
-    int s2 = window->support;
-    while(rel[0] != s2) {
+    while(rel[0] != n[0]) {
         double kernel = 1.0;
         ptrdiff_t ind = 0;
-        int d;
         for(d = 0; d < painter->ndim; d++) {
-            double * kd = &k[window->support * d];
-            int r = rel[d];
-            int targetpos = ipos[d] + r;
-            kernel *= kd[r];
-            if(painter->Nmesh[d] > 0) {
-                while(targetpos >= painter->Nmesh[d]) {
-                    targetpos -= painter->Nmesh[d];
+            kernel *= kk[support * d + rel[d]];
+            ind += off[support * d + rel[d]];
+        }
+        mkname(_scatter)(painter, ind, kernel, weight);
+
+        rel[painter->ndim - 1] ++;
+        for(d = painter->ndim - 1; d > 0; d --) {
+            if(UNLIKELY(rel[d] == n[d])) {
+                rel[d - 1] ++;
+                rel[d] = 0;
+            }
+        }
+    }
+    return;
+}
+
+/* readout with the base cell ipos and the 1d kernel weights k[d * support + i] of a particle. */
+static void
+mkname(_generic_readout_k) (PMeshPainter * painter, int ipos[], double k[], int support, double value[])
+{
+    ptrdiff_t off[painter->ndim * support];
+    double kk[painter->ndim * support];
+    int n[painter->ndim];
+
+    if(!_wrap_k(painter, ipos, k, support, off, kk, n)) return;
+
+    const ptrdiff_t * o0 = off;
+    const double * k0 = kk;
+    int i, j, f;
+    switch(painter->ndim) {
+        case 1:
+            for(i = 0; i < n[0]; i ++) {
+                mkname(_gather)(painter, o0[i], k0[i], value);
+            }
+        return;
+        /* partial sums: reduce along the fastest axis first. */
+        case 2: {
+            const ptrdiff_t * o1 = off + support;
+            const double * k1 = kk + support;
+            const int line = mkname(_is_line)(painter, o1, n[1]);
+            for(f = 0; f < painter->nfields; f ++) {
+                const char * base = (const char*) painter->canvases[f];
+                double s = 0;
+                for(i = 0; i < n[0]; i ++) {
+                    s += k0[i] * mkname(_gather_line)(base + o0[i], o1, k1, n[1], line);
                 }
-                while(targetpos < 0) {
-                    targetpos += painter->Nmesh[d];
+                value[f] += s;
+            }
+        }
+        return;
+        case 3: {
+            const ptrdiff_t * o1 = off + support;
+            const double * k1 = kk + support;
+            const ptrdiff_t * o2 = off + 2 * support;
+            const double * k2 = kk + 2 * support;
+            const int line = mkname(_is_line)(painter, o2, n[2]);
+            for(f = 0; f < painter->nfields; f ++) {
+                const char * base = (const char*) painter->canvases[f];
+                double s = 0;
+                for(i = 0; i < n[0]; i ++) {
+                    double si = 0;
+                    for(j = 0; j < n[1]; j ++) {
+                        si += k1[j] * mkname(_gather_line)(base + o0[i] + o1[j], o2, k2, n[2], line);
+                    }
+                    s += k0[i] * si;
                 }
+                value[f] += s;
             }
-            if(UNLIKELY(targetpos >= painter->size[d]))
-                goto outside;
-            if(UNLIKELY(targetpos < 0))
-                goto outside;
-            ind += painter->strides[d] * targetpos;
         }
-#ifdef _OPENMP
-#pragma omp atomic
-#endif
-        * (FLOAT*) (canvas + ind) += weight * kernel;
+        return;
+    }
+
+    int rel[painter->ndim];
+    int d;
+    for(d =0; d < painter->ndim; d++) rel[d] = 0;
+
+    while(rel[0] != n[0]) {
+        double kernel = 1.0;
+        ptrdiff_t ind = 0;
+        for(d = 0; d < painter->ndim; d++) {
+            kernel *= kk[support * d + rel[d]];
+            ind += off[support * d + rel[d]];
+        }
+        mkname(_gather)(painter, ind, kernel, value);
 
-    outside:
         rel[painter->ndim - 1] ++;
         for(d = painter->ndim - 1; d > 0; d --) {
-            if(UNLIKELY(rel[d] == s2)) {
+            if(UNLIKELY(rel[d] == n[d])) {
                 rel[d - 1] ++;
                 rel[d] = 0;
             }
@@ -72,8 +227,8 @@ mkname(_generic_paint) (PMeshPainter * painter, double pos[], double weight, dou
     return;
 }
 
-static double
-mkname(_generic_readout) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_generic_paint) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
     PMeshWindowInfo window[1];
     pmesh_window_info_init(window, painter->ndim, painter->nativesupport, painter->support * hsml);
@@ -85,136 +240,116 @@ mkname(_generic_readout) (PMeshPainter * painter, double pos[], double hsml)
     if(painter->getfastmethod &&
        painter->getfastmethod(painter, window, &fastpaint, &fastreadout)) {
 
-        return fastreadout(painter, pos, hsml);
+        fastpaint(painter, pos, weight, hsml);
+        return;
     }
 
-    double value = 0;
     int ipos[painter->ndim];
-    double k[painter->ndim * window->support];
 
-    char * canvas = (char*) painter->canvas;
+    /* the max support is 32 */
+    double k[painter->ndim * window->support];
 
     _fill_k(painter, window, pos, ipos, k);
 
-    int rel[painter->ndim];
-    int d;
-    for(d =0; d < painter->ndim; d++) rel[d] = 0;
+    mkname(_generic_paint_k)(painter, ipos, k, window->support, weight);
+}
 
-    int s2 = window->support;
-    while(rel[0] != s2) {
-        double kernel = 1.0;
-        ptrdiff_t ind = 0;
-        int d;
-        for(d = 0; d < painter->ndim; d++) {
-            double * kd = &k[window->support * d];
-            int r = rel[d];
+static void
+mkname(_generic_readout) (PMeshPainter * painter, double pos[], double value[], double hsml)
+{
+    PMeshWindowInfo window[1];
+    pmesh_window_info_init(window, painter->ndim, painter->nativesupport, painter->support * hsml);
 
-            kernel *= kd[r];
+    /* Check for fast painting routines */
+    paintfunc fastpaint;
+    readoutfunc fastreadout;
 
-            int targetpos = ipos[d] + r;
+    if(painter->getfastmethod &&
+       painter->getfastmethod(painter, window, &fastpaint, &fastreadout)) {
 
-            if(painter->Nmesh[d] > 0) {
-                while(targetpos >= painter->Nmesh[d]) {
-                    targetpos -= painter->Nmesh[d];
-                }
-                while(targetpos < 0) {
-                    targetpos += painter->Nmesh[d];
-                }
-            }
-            if(UNLIKELY(targetpos >= painter->size[d])) {
-                goto outside;
-            }
-            if(UNLIKELY(targetpos < 0))
-                goto outside;
-            ind += painter->strides[d] * targetpos;
-        }
-        value += kernel * *(FLOAT* )(canvas + ind);
-outside:
-        rel[painter->ndim - 1] ++;
-        for(d = painter->ndim - 1; d > 0; d --) {
-            if(UNLIKELY(rel[d] == s2)) {
-                rel[d - 1] ++;
-                rel[d] = 0;
-            }
-        }
+        fastreadout(painter, pos, value, hsml);
+        return;
     }
-    return value;
+
+    int ipos[painter->ndim];
+    double k[painter->ndim * window->support];
+
+    _fill_k(painter, window, pos, ipos, k);
+
+    mkname(_generic_readout_k)(painter, ipos, k, window->support, value);
 }
 
 static inline void
-mkname (_WRtPlus3) (FLOAT * canvas, 
-        const int i, const int j, const int k, const double f, const PMeshPainter * const painter)
+mkname (_WRtPlus3) (const int i, const int j, const int k, const double f, const double weight[], const PMeshPainter * const painter)
 {
     if(UNLIKELY(0 > i || painter->size[0] <= i)) return;
     if(UNLIKELY(0 > j || painter->size[1] <= j)) return;
     if(UNLIKELY(0 > k || painter->size[2] <= k)) return;
     ptrdiff_t ind = k * painter->strides[2] + j * painter->strides[1] + i * painter->strides[0];
-#ifdef _OPENMP
-#pragma omp atomic
-#endif
-    * (FLOAT*) ((char*) canvas + ind) += f;
+    mkname(_scatter)(painter, ind, f, weight);
     return;
 }
 
-static inline double 
-mkname (_REd3) (FLOAT const * const canvas, const int i, const int j, const int k, const double w, const PMeshPainter * const painter)
+static inline void
+mkname (_REd3) (const int i, const int j, const int k, const double w, double value[], const PMeshPainter * const painter)
 {
-    if(UNLIKELY(0 > i || painter->size[0] <= i)) return 0;
-    if(UNLIKELY(0 > j || painter->size[1] <= j)) return 0;
-    if(UNLIKELY(0 > k || painter->size[2] <= k)) return 0;
+    if(UNLIKELY(0 > i || painter->size[0] <= i)) return;
+    if(UNLIKELY(0 > j || painter->size[1] <= j)) return;
+    if(UNLIKELY(0 > k || painter->size[2] <= k)) return;
     ptrdiff_t ind = k * painter->strides[2] + j * painter->strides[1] + i * painter->strides[0];
-    return (* (FLOAT*) ((char*) canvas + ind)) * w;
+    mkname(_gather)(painter, ind, w, value);
 }
 
 static inline void
-mkname (_WRtPlus2) (FLOAT * canvas, 
-        const int i, const int j, const double f, const PMeshPainter * const painter)
+mkname (_WRtPlus2) (const int i, const int j, const double f, const double weight[], const PMeshPainter * const painter)
 {
     if(UNLIKELY(0 > i || painter->size[0] <= i)) return;
     if(UNLIKELY(0 > j || painter->size[1] <= j)) return;
     ptrdiff_t ind = j * painter->strides[1] + i * painter->strides[0];
-#ifdef _OPENMP
-#pragma omp atomic
-#endif
-    * (FLOAT*) ((char*) canvas + ind) += f;
+    mkname(_scatter)(painter, ind, f, weight);
     return;
 }
 
-static inline double 
-mkname (_REd2) (FLOAT const * const canvas, const int i, const int j, const double w, const PMeshPainter * const painter)
+static inline void
+mkname (_REd2) (const int i, const int j, const double w, double value[], const PMeshPainter * const painter)
 {
-    if(UNLIKELY(0 > i || painter->size[0] <= i)) return 0;
-    if(UNLIKELY(0 > j || painter->size[1] <= j)) return 0;
+    if(UNLIKELY(0 > i || painter->size[0] <= i)) return;
+    if(UNLIKELY(0 > j || painter->size[1] <= j)) return;
     ptrdiff_t ind = j * painter->strides[1] + i * painter->strides[0];
-    return (* (FLOAT*) ((char*) canvas + ind)) * w;
+    mkname(_gather)(painter, ind, w, value);
 }
 
 static inline void
-mkname (_WRtPlus1) (FLOAT * canvas, 
-        const int i, const double f, const PMeshPainter * const painter)
+mkname (_WRtPlus1) (const int i, const double f, const double weight[], const PMeshPainter * const painter)
 {
     if(UNLIKELY(0 > i || painter->size[0] <= i)) return;
     ptrdiff_t ind = i * painter->strides[0];
-#ifdef _OPENMP
-#pragma omp atomic
-#endif
-    * (FLOAT*) ((char*) canvas + ind) += f;
+    mkname(_scatter)(painter, ind, f, weight);
     return;
 }
 
-static inline double 
-mkname (_REd1) (FLOAT const * const canvas, const int i, const double w, const PMeshPainter * const painter)
+static inline void
+mkname (_REd1) (const int i, const double w, double value[], const PMeshPainter * const painter)
 {
-    if(UNLIKELY(0 > i || painter->size[0] <= i)) return 0;
+    if(UNLIKELY(0 > i || painter->size[0] <= i)) return;
     ptrdiff_t ind = i * painter->strides[0];
-    return (* (FLOAT*) ((char*) canvas + ind)) * w;
+    mkname(_gather)(painter, ind, w, value);
 }
 
-#define ACCESS3(func, a, b, c) \
-    mkname(func)(canvas, IJK ## a [0], IJK ## b [1], IJK ## c [2], V ## a [0] * V ## b [1] * V ## c [2], painter)
+#define READ3(a, b, c) \
+    mkname(_REd3)(IJK ## a [0], IJK ## b [1], IJK ## c [2], V ## a [0] * V ## b [1] * V ## c [2], value, painter)
+
+#define READ2(a, b) \
+    mkname(_REd2)(IJK ## a [0], IJK ## b [1], V ## a [0] * V ## b [1], value, painter)
+
+#define READ1(a) \
+    mkname(_REd1)(IJK ## a [0], V ## a [0], value, painter)
+
+#define WRITE3(a, b, c) \
+    mkname(_WRtPlus3)(IJK ## a [0], IJK ## b [1], IJK ## c [2], V ## a [0] * V ## b [1] * V ## c [2], weight, painter)
 
-#define ACCESS2(func, a, b) \
-    mkname(func)(canvas, IJK ## a [0], IJK ## b [1], V ## a [0] * V ## b [1], painter)
+#define WRITE2(a, b) \
+    mkname(_WRtPlus2)(IJK ## a [0], IJK ## b [1], V ## a [0] * V ## b [1], weight, painter)
 
-#define ACCESS1(func, a) \
-    mkname(func)(canvas, IJK ## a [0], V ## a [0], painter)
+#define WRITE1(a) \
+    mkname(_WRtPlus1)(IJK ## a [0], V ## a [0], weight, painter)
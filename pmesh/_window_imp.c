@@ -59,14 +59,17 @@ _fill_k(PMeshPainter * painter, PMeshWindowInfo * window, double pos[], int ipos
         ipos[d] = floor(gpos[d] + window->shift) - window->left;
         double dx = gpos[d] - ipos[d]; /* relative to the left most nonzero.*/
         int i;
-        for(i = 0; i < window->support; i ++) {
-            double x = (dx - i) * window->vfactor;
-            if(painter->order[d] == 0) {
+        if(painter->order[d] == 0) {
+            for(i = 0; i < window->support; i ++) {
+                double x = (dx - i) * window->vfactor;
                 kd[i] = painter->kernel(x) * window->vfactor;
-            } else {
-                kd[i] = painter->diff(x) * painter->scale[d] * window->vfactor * window->vfactor;
             }
-            //printf("i = %d x = %g kd[i] = %g\n", i, x, kd[i]);
+        } else {
+            double factor = painter->scale[d] * window->vfactor * window->vfactor;
+            for(i = 0; i < window->support; i ++) {
+                double x = (dx - i) * window->vfactor;
+                kd[i] = painter->diff(x) * factor;
+            }
         }
         /* Watch out: do not renormalize per particle */
 
@@ -82,6 +85,39 @@ _fill_k(PMeshPainter * painter, PMeshWindowInfo * window, double pos[], int ipos
     }
 }
 
+/* Wrap the cells ipos[d] + i of each axis into the canvas, once per particle.
+ * The n[d] cells that fall on the canvas are compacted to the byte offsets
+ * off[d * support + j] and the weights kk[d * support + j].
+ * Returns 0 if the particle does not touch the canvas. */
+static int
+_wrap_k(PMeshPainter * painter, int ipos[], double k[], int support, ptrdiff_t off[], double kk[], int n[])
+{
+    int d;
+    for(d = 0; d < painter->ndim; d++) {
+        int i;
+        int j = 0;
+        for(i = 0; i < support; i ++) {
+            int targetpos = ipos[d] + i;
+            if(painter->Nmesh[d] > 0) {
+                while(targetpos >= painter->Nmesh[d]) {
+                    targetpos -= painter->Nmesh[d];
+                }
+                while(targetpos < 0) {
+                    targetpos += painter->Nmesh[d];
+                }
+            }
+            if(UNLIKELY(targetpos >= painter->size[d])) continue;
+            if(UNLIKELY(targetpos < 0)) continue;
+            off[d * support + j] = painter->strides[d] * targetpos;
+            kk[d * support + j] = k[d * support + i];
+            j ++;
+        }
+        n[d] = j;
+        if(j == 0) return 0;
+    }
+    return 1;
+}
+
 #define FLOAT float
 #define mkname(a) a ## _ ## float
 #include "_window_generics.h"
@@ -91,8 +127,12 @@ _fill_k(PMeshPainter * painter, PMeshWindowInfo * window, double pos[], int ipos
 #include "_window_tuned_pcs.h"
 #undef FLOAT
 #undef mkname
-#undef ACCESS3
-#undef ACCESS2
+#undef READ3
+#undef READ2
+#undef READ1
+#undef WRITE3
+#undef WRITE2
+#undef WRITE1
 #define mkname(a) a ## _ ## double
 #define FLOAT double
 #include "_window_generics.h"
@@ -102,8 +142,12 @@ _fill_k(PMeshPainter * painter, PMeshWindowInfo * window, double pos[], int ipos
 #include "_window_tuned_pcs.h"
 #undef FLOAT
 #undef mkname
-#undef ACCESS3
-#undef ACCESS2
+#undef READ3
+#undef READ2
+#undef READ1
+#undef WRITE3
+#undef WRITE2
+#undef WRITE1
 
 static double
 _nearest_kernel(double x) {
@@ -248,12 +292,21 @@ pmesh_painter_init(PMeshPainter * painter)
 {
     painter->getfastmethod = NULL;
 
+    if(painter->nfields <= 1) {
+        painter->nfields = 1;
+        painter->canvases[0] = painter->canvas;
+    }
+
     if(painter->canvas_dtype_elsize == 8) {
         painter->paint = _generic_paint_double;
         painter->readout = _generic_readout_double;
+        painter->paint_k = _generic_paint_k_double;
+        painter->readout_k = _generic_readout_k_double;
     } else {
         painter->paint = _generic_paint_float;
         painter->readout = _generic_readout_float;
+        painter->paint_k = _generic_paint_k_float;
+        painter->readout_k = _generic_readout_k_float;
     }
 
     switch(painter->type) {
@@ -459,15 +512,112 @@ pmesh_painter_init(PMeshPainter * painter)
 }
 
 void
-pmesh_painter_paint(PMeshPainter * painter, double pos[], double weight, double hsml)
+pmesh_painter_paint(PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
     painter->paint(painter, pos, weight, hsml);
 }
 
-double
-pmesh_painter_readout(PMeshPainter * painter, double pos[], double hsml)
+void
+pmesh_painter_readout(PMeshPainter * painter, double pos[], double value[], double hsml)
+{
+    int f;
+    for(f = 0; f < painter->nfields; f ++) {
+        value[f] = 0;
+    }
+    painter->readout(painter, pos, value, hsml);
+}
+
+int
+pmesh_painter_fill(PMeshPainter * painter, double pos[], double hsml, int ipos[], double k[])
+{
+    PMeshWindowInfo window[1];
+    pmesh_window_info_init(window, painter->ndim, painter->nativesupport, painter->support * hsml);
+
+    paintfunc fastpaint;
+    readoutfunc fastreadout;
+    if(painter->getfastmethod &&
+       painter->getfastmethod(painter, window, &fastpaint, &fastreadout)) {
+        /* the tuned kernels do not scale with hsml; follow them. */
+        pmesh_window_info_init(window, painter->ndim, painter->nativesupport, painter->support);
+    }
+    _fill_k(painter, window, pos, ipos, k);
+    return window->support;
+}
+
+void
+pmesh_painter_paint_k(PMeshPainter * painter, int ipos[], double k[], int support, double weight[])
+{
+    painter->paint_k(painter, ipos, k, support, weight);
+}
+
+void
+pmesh_painter_readout_k(PMeshPainter * painter, int ipos[], double k[], int support, double value[])
 {
-    return painter->readout(painter, pos, hsml);
+    int f;
+    for(f = 0; f < painter->nfields; f ++) {
+        value[f] = 0;
+    }
+    painter->readout_k(painter, ipos, k, support, value);
+}
+
+void
+pmesh_painter_paint_many(PMeshPainter * painter, int n, double pos[], double weight[], double hsml[])
+{
+    int i;
+    if(hsml) {
+        for(i = 0; i < n; i ++) {
+            painter->paint(painter, &pos[i * painter->ndim], &weight[i * painter->nfields], hsml[i]);
+        }
+        return;
+    }
+
+    /* all particles share the window; resolve the tuned kernel once for the block */
+    PMeshWindowInfo * window = &painter->window;
+    paintfunc fastpaint;
+    readoutfunc fastreadout;
+
+    if(painter->getfastmethod &&
+       painter->getfastmethod(painter, window, &fastpaint, &fastreadout)) {
+        for(i = 0; i < n; i ++) {
+            fastpaint(painter, &pos[i * painter->ndim], &weight[i * painter->nfields], 1.0);
+        }
+        return;
+    }
+
+    for(i = 0; i < n; i ++) {
+        painter->paint(painter, &pos[i * painter->ndim], &weight[i * painter->nfields], 1.0);
+    }
+}
+
+void
+pmesh_painter_readout_many(PMeshPainter * painter, int n, double pos[], double value[], double hsml[])
+{
+    int i;
+    for(i = 0; i < n * painter->nfields; i ++) {
+        value[i] = 0;
+    }
+    if(hsml) {
+        for(i = 0; i < n; i ++) {
+            painter->readout(painter, &pos[i * painter->ndim], &value[i * painter->nfields], hsml[i]);
+        }
+        return;
+    }
+
+    PMeshWindowInfo * window = &painter->window;
+    paintfunc fastpaint;
+    readoutfunc fastreadout;
+
+    if(painter->getfastmethod &&
+       painter->getfastmethod(painter, window, &fastpaint, &fastreadout)) {
+        for(i = 0; i < n; i ++) {
+            fastreadout(painter, &pos[i * painter->ndim], &value[i * painter->nfields], 1.0);
+        }
+        return;
+    }
+
+    for(i = 0; i < n; i ++) {
+        painter->readout(painter, &pos[i * painter->ndim], &value[i * painter->nfields], 1.0);
+    }
 }
 
 double
@@ -40,8 +40,11 @@ typedef struct PMeshPainter PMeshPainter;
 typedef double (*pmesh_kernelfunc)(double x);
 typedef double (*pmesh_fwindowfunc)(double w);
 
-typedef    void   (*paintfunc)(PMeshPainter * painter, double pos[], double weight, double hsml);
-typedef    double (*readoutfunc)(PMeshPainter * painter, double pos[], double hsml);
+typedef    void   (*paintfunc)(PMeshPainter * painter, double pos[], double weight[], double hsml);
+typedef    void (*readoutfunc)(PMeshPainter * painter, double pos[], double value[], double hsml);
+
+typedef    void   (*paintkfunc)(PMeshPainter * painter, int ipos[], double k[], int support, double weight[]);
+typedef    void (*readoutkfunc)(PMeshPainter * painter, int ipos[], double k[], int support, double value[]);
 
 typedef int (*getfastmethodfunc)(PMeshPainter * painter, PMeshWindowInfo * window, paintfunc * paint, readoutfunc * readout);
 
@@ -56,12 +59,18 @@ struct PMeshPainter {
 
     void * canvas;
     int canvas_dtype_elsize;
+    /* paint deposits weight[f] to canvases[f], readout reads value[f] from canvases[f];
+     * all canvases share size and strides */
+    int nfields;
+    void * canvases[32];
     ptrdiff_t size[32];
     ptrdiff_t strides[32];
 
     /* Private: */
     paintfunc paint;
     readoutfunc readout;
+    paintkfunc paint_k;
+    readoutkfunc readout_k;
     getfastmethodfunc getfastmethod;
 
     pmesh_kernelfunc kernel;
@@ -77,10 +86,32 @@ void
 pmesh_painter_init(PMeshPainter * painter);
 
 void
-pmesh_painter_paint(PMeshPainter * painter, double pos[], double weight, double hsml);
+pmesh_painter_paint(PMeshPainter * painter, double pos[], double weight[], double hsml);
 
-double
-pmesh_painter_readout(PMeshPainter * painter, double pos[], double hsml);
+void
+pmesh_painter_readout(PMeshPainter * painter, double pos[], double value[], double hsml);
+
+/* Paint or read out a block of n particles with one call; pos[i * ndim + d],
+ * weight[i * nfields + f] / value[i * nfields + f], and hsml[i] (NULL for 1).
+ * Without hsml the kernel is resolved once for the block. */
+void
+pmesh_painter_paint_many(PMeshPainter * painter, int n, double pos[], double weight[], double hsml[]);
+
+void
+pmesh_painter_readout_many(PMeshPainter * painter, int n, double pos[], double value[], double hsml[]);
+
+/* Resample plans: the base cell and the 1d kernel weights of a particle are
+ * computed once by pmesh_painter_fill, and replayed by pmesh_painter_paint_k
+ * and pmesh_painter_readout_k without evaluating the window again.
+ * k[d * support + i] is the weight of cell ipos[d] + i along axis d. */
+int
+pmesh_painter_fill(PMeshPainter * painter, double pos[], double hsml, int ipos[], double k[]);
+
+void
+pmesh_painter_paint_k(PMeshPainter * painter, int ipos[], double k[], int support, double weight[]);
+
+void
+pmesh_painter_readout_k(PMeshPainter * painter, int ipos[], double k[], int support, double value[]);
 
 double
 pmesh_painter_get_fwindow(PMeshPainter * painter, double w);
@@ -32,103 +32,73 @@
     } \
 
 static void
-mkname(_cic_tuned_paint3) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_cic_tuned_paint3) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_CIC(3);
 
-    V0[0] *= weight;
-    V1[0] *= weight;
-
-    ACCESS3(_WRtPlus3, 0, 0, 0);
-    ACCESS3(_WRtPlus3, 0, 0, 1);
-    ACCESS3(_WRtPlus3, 0, 1, 0);
-    ACCESS3(_WRtPlus3, 0, 1, 1);
-    ACCESS3(_WRtPlus3, 1, 0, 0);
-    ACCESS3(_WRtPlus3, 1, 0, 1);
-    ACCESS3(_WRtPlus3, 1, 1, 0);
-    ACCESS3(_WRtPlus3, 1, 1, 1);
+    WRITE3(0, 0, 0);
+    WRITE3(0, 0, 1);
+    WRITE3(0, 1, 0);
+    WRITE3(0, 1, 1);
+    WRITE3(1, 0, 0);
+    WRITE3(1, 0, 1);
+    WRITE3(1, 1, 0);
+    WRITE3(1, 1, 1);
 }
 
-static double
-mkname(_cic_tuned_readout3) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_cic_tuned_readout3) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_CIC(3);
 
-    double value = 0;
-
-    value += ACCESS3(_REd3, 0, 0, 0);
-    value += ACCESS3(_REd3, 0, 0, 1);
-    value += ACCESS3(_REd3, 0, 1, 0);
-    value += ACCESS3(_REd3, 0, 1, 1);
-    value += ACCESS3(_REd3, 1, 0, 0);
-    value += ACCESS3(_REd3, 1, 0, 1);
-    value += ACCESS3(_REd3, 1, 1, 0);
-    value += ACCESS3(_REd3, 1, 1, 1);
-    return value;
+    READ3(0, 0, 0);
+    READ3(0, 0, 1);
+    READ3(0, 1, 0);
+    READ3(0, 1, 1);
+    READ3(1, 0, 0);
+    READ3(1, 0, 1);
+    READ3(1, 1, 0);
+    READ3(1, 1, 1);
 }
 
 static void
-mkname(_cic_tuned_paint2) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_cic_tuned_paint2) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_CIC(2);
 
-    V0[0] *= weight;
-    V1[0] *= weight;
-
-    ACCESS2(_WRtPlus2, 0, 0);
-    ACCESS2(_WRtPlus2, 0, 1);
-    ACCESS2(_WRtPlus2, 1, 0);
-    ACCESS2(_WRtPlus2, 1, 1);
+    WRITE2(0, 0);
+    WRITE2(0, 1);
+    WRITE2(1, 0);
+    WRITE2(1, 1);
 }
 
-static double
-mkname(_cic_tuned_readout2) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_cic_tuned_readout2) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_CIC(2);
 
-    double value = 0;
-
-    value += ACCESS2(_REd2, 0, 0);
-    value += ACCESS2(_REd2, 0, 1);
-    value += ACCESS2(_REd2, 1, 0);
-    value += ACCESS2(_REd2, 1, 1);
-    return value;
+    READ2(0, 0);
+    READ2(0, 1);
+    READ2(1, 0);
+    READ2(1, 1);
 }
 
 static void
-mkname(_cic_tuned_paint1) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_cic_tuned_paint1) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_CIC(1);
 
-    V0[0] *= weight;
-    V1[0] *= weight;
-
-    ACCESS1(_WRtPlus1, 0);
-    ACCESS1(_WRtPlus1, 1);
+    WRITE1(0);
+    WRITE1(1);
 }
 
-static double
-mkname(_cic_tuned_readout1) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_cic_tuned_readout1) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_CIC(1);
 
-    double value = 0;
-
-    value += ACCESS1(_REd1, 0);
-    value += ACCESS1(_REd1, 1);
-    return value;
+    READ1(0);
+    READ1(1);
 }
 
 
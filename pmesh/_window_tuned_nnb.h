@@ -27,76 +27,51 @@
     } \
 
 static void
-mkname(_nnb_tuned_paint3) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_nnb_tuned_paint3) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_NNB(3);
 
-    V0[0] *= weight;
-
-    ACCESS3(_WRtPlus3, 0, 0, 0);
+    WRITE3(0, 0, 0);
 }
 
-static double
-mkname(_nnb_tuned_readout3) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_nnb_tuned_readout3) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_NNB(3);
 
-    double value = 0;
-
-    value += ACCESS3(_REd3, 0, 0, 0);
-    return value;
+    READ3(0, 0, 0);
 }
 
 static void
-mkname(_nnb_tuned_paint2) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_nnb_tuned_paint2) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_NNB(2);
-    V0[0] *= weight;
 
-    ACCESS2(_WRtPlus2, 0, 0);
+    WRITE2(0, 0);
 }
 
-static double
-mkname(_nnb_tuned_readout2) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_nnb_tuned_readout2) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_NNB(2);
 
-    double value = 0;
-
-    value += ACCESS2(_REd2, 0, 0);
-    return value;
+    READ2(0, 0);
 }
 
 static void
-mkname(_nnb_tuned_paint1) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_nnb_tuned_paint1) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_NNB(1);
-    V0[0] *= weight;
 
-    ACCESS1(_WRtPlus1, 0);
+    WRITE1(0);
 }
 
-static double
-mkname(_nnb_tuned_readout1) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_nnb_tuned_readout1) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_NNB(1);
 
-    double value = 0;
-
-    value += ACCESS1(_REd1, 0);
-    return value;
+    READ1(0);
 }
 
 
@@ -52,249 +52,213 @@
     } \
 
 static void
-mkname(_pcs_tuned_paint3) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_pcs_tuned_paint3) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_PCS(3);
 
-    V0[0] *= weight;
-    V1[0] *= weight;
-    V2[0] *= weight;
-    V3[0] *= weight;
-
-    ACCESS3(_WRtPlus3, 0, 0, 0);
-    ACCESS3(_WRtPlus3, 0, 0, 1);
-    ACCESS3(_WRtPlus3, 0, 0, 2);
-    ACCESS3(_WRtPlus3, 0, 0, 3);
-    ACCESS3(_WRtPlus3, 0, 1, 0);
-    ACCESS3(_WRtPlus3, 0, 1, 1);
-    ACCESS3(_WRtPlus3, 0, 1, 2);
-    ACCESS3(_WRtPlus3, 0, 1, 3);
-    ACCESS3(_WRtPlus3, 0, 2, 0);
-    ACCESS3(_WRtPlus3, 0, 2, 1);
-    ACCESS3(_WRtPlus3, 0, 2, 2);
-    ACCESS3(_WRtPlus3, 0, 2, 3);
-    ACCESS3(_WRtPlus3, 0, 3, 0);
-    ACCESS3(_WRtPlus3, 0, 3, 1);
-    ACCESS3(_WRtPlus3, 0, 3, 2);
-    ACCESS3(_WRtPlus3, 0, 3, 3);
-    ACCESS3(_WRtPlus3, 1, 0, 0);
-    ACCESS3(_WRtPlus3, 1, 0, 1);
-    ACCESS3(_WRtPlus3, 1, 0, 2);
-    ACCESS3(_WRtPlus3, 1, 0, 3);
-    ACCESS3(_WRtPlus3, 1, 1, 0);
-    ACCESS3(_WRtPlus3, 1, 1, 1);
-    ACCESS3(_WRtPlus3, 1, 1, 2);
-    ACCESS3(_WRtPlus3, 1, 1, 3);
-    ACCESS3(_WRtPlus3, 1, 2, 0);
-    ACCESS3(_WRtPlus3, 1, 2, 1);
-    ACCESS3(_WRtPlus3, 1, 2, 2);
-    ACCESS3(_WRtPlus3, 1, 2, 3);
-    ACCESS3(_WRtPlus3, 1, 3, 0);
-    ACCESS3(_WRtPlus3, 1, 3, 1);
-    ACCESS3(_WRtPlus3, 1, 3, 2);
-    ACCESS3(_WRtPlus3, 1, 3, 3);
-    ACCESS3(_WRtPlus3, 2, 0, 0);
-    ACCESS3(_WRtPlus3, 2, 0, 1);
-    ACCESS3(_WRtPlus3, 2, 0, 2);
-    ACCESS3(_WRtPlus3, 2, 0, 3);
-    ACCESS3(_WRtPlus3, 2, 1, 0);
-    ACCESS3(_WRtPlus3, 2, 1, 1);
-    ACCESS3(_WRtPlus3, 2, 1, 2);
-    ACCESS3(_WRtPlus3, 2, 1, 3);
-    ACCESS3(_WRtPlus3, 2, 2, 0);
-    ACCESS3(_WRtPlus3, 2, 2, 1);
-    ACCESS3(_WRtPlus3, 2, 2, 2);
-    ACCESS3(_WRtPlus3, 2, 2, 3);
-    ACCESS3(_WRtPlus3, 2, 3, 0);
-    ACCESS3(_WRtPlus3, 2, 3, 1);
-    ACCESS3(_WRtPlus3, 2, 3, 2);
-    ACCESS3(_WRtPlus3, 2, 3, 3);
-    ACCESS3(_WRtPlus3, 3, 0, 0);
-    ACCESS3(_WRtPlus3, 3, 0, 1);
-    ACCESS3(_WRtPlus3, 3, 0, 2);
-    ACCESS3(_WRtPlus3, 3, 0, 3);
-    ACCESS3(_WRtPlus3, 3, 1, 0);
-    ACCESS3(_WRtPlus3, 3, 1, 1);
-    ACCESS3(_WRtPlus3, 3, 1, 2);
-    ACCESS3(_WRtPlus3, 3, 1, 3);
-    ACCESS3(_WRtPlus3, 3, 2, 0);
-    ACCESS3(_WRtPlus3, 3, 2, 1);
-    ACCESS3(_WRtPlus3, 3, 2, 2);
-    ACCESS3(_WRtPlus3, 3, 2, 3);
-    ACCESS3(_WRtPlus3, 3, 3, 0);
-    ACCESS3(_WRtPlus3, 3, 3, 1);
-    ACCESS3(_WRtPlus3, 3, 3, 2);
-    ACCESS3(_WRtPlus3, 3, 3, 3);
+    WRITE3(0, 0, 0);
+    WRITE3(0, 0, 1);
+    WRITE3(0, 0, 2);
+    WRITE3(0, 0, 3);
+    WRITE3(0, 1, 0);
+    WRITE3(0, 1, 1);
+    WRITE3(0, 1, 2);
+    WRITE3(0, 1, 3);
+    WRITE3(0, 2, 0);
+    WRITE3(0, 2, 1);
+    WRITE3(0, 2, 2);
+    WRITE3(0, 2, 3);
+    WRITE3(0, 3, 0);
+    WRITE3(0, 3, 1);
+    WRITE3(0, 3, 2);
+    WRITE3(0, 3, 3);
+    WRITE3(1, 0, 0);
+    WRITE3(1, 0, 1);
+    WRITE3(1, 0, 2);
+    WRITE3(1, 0, 3);
+    WRITE3(1, 1, 0);
+    WRITE3(1, 1, 1);
+    WRITE3(1, 1, 2);
+    WRITE3(1, 1, 3);
+    WRITE3(1, 2, 0);
+    WRITE3(1, 2, 1);
+    WRITE3(1, 2, 2);
+    WRITE3(1, 2, 3);
+    WRITE3(1, 3, 0);
+    WRITE3(1, 3, 1);
+    WRITE3(1, 3, 2);
+    WRITE3(1, 3, 3);
+    WRITE3(2, 0, 0);
+    WRITE3(2, 0, 1);
+    WRITE3(2, 0, 2);
+    WRITE3(2, 0, 3);
+    WRITE3(2, 1, 0);
+    WRITE3(2, 1, 1);
+    WRITE3(2, 1, 2);
+    WRITE3(2, 1, 3);
+    WRITE3(2, 2, 0);
+    WRITE3(2, 2, 1);
+    WRITE3(2, 2, 2);
+    WRITE3(2, 2, 3);
+    WRITE3(2, 3, 0);
+    WRITE3(2, 3, 1);
+    WRITE3(2, 3, 2);
+    WRITE3(2, 3, 3);
+    WRITE3(3, 0, 0);
+    WRITE3(3, 0, 1);
+    WRITE3(3, 0, 2);
+    WRITE3(3, 0, 3);
+    WRITE3(3, 1, 0);
+    WRITE3(3, 1, 1);
+    WRITE3(3, 1, 2);
+    WRITE3(3, 1, 3);
+    WRITE3(3, 2, 0);
+    WRITE3(3, 2, 1);
+    WRITE3(3, 2, 2);
+    WRITE3(3, 2, 3);
+    WRITE3(3, 3, 0);
+    WRITE3(3, 3, 1);
+    WRITE3(3, 3, 2);
+    WRITE3(3, 3, 3);
 }
 
-static double
-mkname(_pcs_tuned_readout3) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_pcs_tuned_readout3) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_PCS(3);
 
-    double value = 0;
-
-    value += ACCESS3(_REd3, 0, 0, 0);
-    value += ACCESS3(_REd3, 0, 0, 1);
-    value += ACCESS3(_REd3, 0, 0, 2);
-    value += ACCESS3(_REd3, 0, 0, 3);
-    value += ACCESS3(_REd3, 0, 1, 0);
-    value += ACCESS3(_REd3, 0, 1, 1);
-    value += ACCESS3(_REd3, 0, 1, 2);
-    value += ACCESS3(_REd3, 0, 1, 3);
-    value += ACCESS3(_REd3, 0, 2, 0);
-    value += ACCESS3(_REd3, 0, 2, 1);
-    value += ACCESS3(_REd3, 0, 2, 2);
-    value += ACCESS3(_REd3, 0, 2, 3);
-    value += ACCESS3(_REd3, 0, 3, 0);
-    value += ACCESS3(_REd3, 0, 3, 1);
-    value += ACCESS3(_REd3, 0, 3, 2);
-    value += ACCESS3(_REd3, 0, 3, 3);
-    value += ACCESS3(_REd3, 1, 0, 0);
-    value += ACCESS3(_REd3, 1, 0, 1);
-    value += ACCESS3(_REd3, 1, 0, 2);
-    value += ACCESS3(_REd3, 1, 0, 3);
-    value += ACCESS3(_REd3, 1, 1, 0);
-    value += ACCESS3(_REd3, 1, 1, 1);
-    value += ACCESS3(_REd3, 1, 1, 2);
-    value += ACCESS3(_REd3, 1, 1, 3);
-    value += ACCESS3(_REd3, 1, 2, 0);
-    value += ACCESS3(_REd3, 1, 2, 1);
-    value += ACCESS3(_REd3, 1, 2, 2);
-    value += ACCESS3(_REd3, 1, 2, 3);
-    value += ACCESS3(_REd3, 1, 3, 0);
-    value += ACCESS3(_REd3, 1, 3, 1);
-    value += ACCESS3(_REd3, 1, 3, 2);
-    value += ACCESS3(_REd3, 1, 3, 3);
-    value += ACCESS3(_REd3, 2, 0, 0);
-    value += ACCESS3(_REd3, 2, 0, 1);
-    value += ACCESS3(_REd3, 2, 0, 2);
-    value += ACCESS3(_REd3, 2, 0, 3);
-    value += ACCESS3(_REd3, 2, 1, 0);
-    value += ACCESS3(_REd3, 2, 1, 1);
-    value += ACCESS3(_REd3, 2, 1, 2);
-    value += ACCESS3(_REd3, 2, 1, 3);
-    value += ACCESS3(_REd3, 2, 2, 0);
-    value += ACCESS3(_REd3, 2, 2, 1);
-    value += ACCESS3(_REd3, 2, 2, 2);
-    value += ACCESS3(_REd3, 2, 2, 3);
-    value += ACCESS3(_REd3, 2, 3, 0);
-    value += ACCESS3(_REd3, 2, 3, 1);
-    value += ACCESS3(_REd3, 2, 3, 2);
-    value += ACCESS3(_REd3, 2, 3, 3);
-    value += ACCESS3(_REd3, 3, 0, 0);
-    value += ACCESS3(_REd3, 3, 0, 1);
-    value += ACCESS3(_REd3, 3, 0, 2);
-    value += ACCESS3(_REd3, 3, 0, 3);
-    value += ACCESS3(_REd3, 3, 1, 0);
-    value += ACCESS3(_REd3, 3, 1, 1);
-    value += ACCESS3(_REd3, 3, 1, 2);
-    value += ACCESS3(_REd3, 3, 1, 3);
-    value += ACCESS3(_REd3, 3, 2, 0);
-    value += ACCESS3(_REd3, 3, 2, 1);
-    value += ACCESS3(_REd3, 3, 2, 2);
-    value += ACCESS3(_REd3, 3, 2, 3);
-    value += ACCESS3(_REd3, 3, 3, 0);
-    value += ACCESS3(_REd3, 3, 3, 1);
-    value += ACCESS3(_REd3, 3, 3, 2);
-    value += ACCESS3(_REd3, 3, 3, 3);
-    return value;
+    READ3(0, 0, 0);
+    READ3(0, 0, 1);
+    READ3(0, 0, 2);
+    READ3(0, 0, 3);
+    READ3(0, 1, 0);
+    READ3(0, 1, 1);
+    READ3(0, 1, 2);
+    READ3(0, 1, 3);
+    READ3(0, 2, 0);
+    READ3(0, 2, 1);
+    READ3(0, 2, 2);
+    READ3(0, 2, 3);
+    READ3(0, 3, 0);
+    READ3(0, 3, 1);
+    READ3(0, 3, 2);
+    READ3(0, 3, 3);
+    READ3(1, 0, 0);
+    READ3(1, 0, 1);
+    READ3(1, 0, 2);
+    READ3(1, 0, 3);
+    READ3(1, 1, 0);
+    READ3(1, 1, 1);
+    READ3(1, 1, 2);
+    READ3(1, 1, 3);
+    READ3(1, 2, 0);
+    READ3(1, 2, 1);
+    READ3(1, 2, 2);
+    READ3(1, 2, 3);
+    READ3(1, 3, 0);
+    READ3(1, 3, 1);
+    READ3(1, 3, 2);
+    READ3(1, 3, 3);
+    READ3(2, 0, 0);
+    READ3(2, 0, 1);
+    READ3(2, 0, 2);
+    READ3(2, 0, 3);
+    READ3(2, 1, 0);
+    READ3(2, 1, 1);
+    READ3(2, 1, 2);
+    READ3(2, 1, 3);
+    READ3(2, 2, 0);
+    READ3(2, 2, 1);
+    READ3(2, 2, 2);
+    READ3(2, 2, 3);
+    READ3(2, 3, 0);
+    READ3(2, 3, 1);
+    READ3(2, 3, 2);
+    READ3(2, 3, 3);
+    READ3(3, 0, 0);
+    READ3(3, 0, 1);
+    READ3(3, 0, 2);
+    READ3(3, 0, 3);
+    READ3(3, 1, 0);
+    READ3(3, 1, 1);
+    READ3(3, 1, 2);
+    READ3(3, 1, 3);
+    READ3(3, 2, 0);
+    READ3(3, 2, 1);
+    READ3(3, 2, 2);
+    READ3(3, 2, 3);
+    READ3(3, 3, 0);
+    READ3(3, 3, 1);
+    READ3(3, 3, 2);
+    READ3(3, 3, 3);
 }
 
 static void
-mkname(_pcs_tuned_paint2) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_pcs_tuned_paint2) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_PCS(2);
 
-    V0[0] *= weight;
-    V1[0] *= weight;
-    V2[0] *= weight;
-    V3[0] *= weight;
-
-    ACCESS2(_WRtPlus2, 0, 0);
-    ACCESS2(_WRtPlus2, 0, 1);
-    ACCESS2(_WRtPlus2, 0, 2);
-    ACCESS2(_WRtPlus2, 0, 3);
-    ACCESS2(_WRtPlus2, 1, 0);
-    ACCESS2(_WRtPlus2, 1, 1);
-    ACCESS2(_WRtPlus2, 1, 2);
-    ACCESS2(_WRtPlus2, 1, 3);
-    ACCESS2(_WRtPlus2, 2, 0);
-    ACCESS2(_WRtPlus2, 2, 1);
-    ACCESS2(_WRtPlus2, 2, 2);
-    ACCESS2(_WRtPlus2, 2, 3);
-    ACCESS2(_WRtPlus2, 3, 0);
-    ACCESS2(_WRtPlus2, 3, 1);
-    ACCESS2(_WRtPlus2, 3, 2);
-    ACCESS2(_WRtPlus2, 3, 3);
+    WRITE2(0, 0);
+    WRITE2(0, 1);
+    WRITE2(0, 2);
+    WRITE2(0, 3);
+    WRITE2(1, 0);
+    WRITE2(1, 1);
+    WRITE2(1, 2);
+    WRITE2(1, 3);
+    WRITE2(2, 0);
+    WRITE2(2, 1);
+    WRITE2(2, 2);
+    WRITE2(2, 3);
+    WRITE2(3, 0);
+    WRITE2(3, 1);
+    WRITE2(3, 2);
+    WRITE2(3, 3);
 }
 
-static double
-mkname(_pcs_tuned_readout2) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_pcs_tuned_readout2) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_PCS(2);
 
-    double value = 0;
-
-    value += ACCESS2(_REd2, 0, 0);
-    value += ACCESS2(_REd2, 0, 1);
-    value += ACCESS2(_REd2, 0, 2);
-    value += ACCESS2(_REd2, 0, 3);
-    value += ACCESS2(_REd2, 1, 0);
-    value += ACCESS2(_REd2, 1, 1);
-    value += ACCESS2(_REd2, 1, 2);
-    value += ACCESS2(_REd2, 1, 3);
-    value += ACCESS2(_REd2, 2, 0);
-    value += ACCESS2(_REd2, 2, 1);
-    value += ACCESS2(_REd2, 2, 2);
-    value += ACCESS2(_REd2, 2, 3);
-    value += ACCESS2(_REd2, 3, 0);
-    value += ACCESS2(_REd2, 3, 1);
-    value += ACCESS2(_REd2, 3, 2);
-    value += ACCESS2(_REd2, 3, 3);
-    return value;
+    READ2(0, 0);
+    READ2(0, 1);
+    READ2(0, 2);
+    READ2(0, 3);
+    READ2(1, 0);
+    READ2(1, 1);
+    READ2(1, 2);
+    READ2(1, 3);
+    READ2(2, 0);
+    READ2(2, 1);
+    READ2(2, 2);
+    READ2(2, 3);
+    READ2(3, 0);
+    READ2(3, 1);
+    READ2(3, 2);
+    READ2(3, 3);
 }
 
 static void
-mkname(_pcs_tuned_paint1) (PMeshPainter * painter, double pos[], double weight, double hsml)
+mkname(_pcs_tuned_paint1) (PMeshPainter * painter, double pos[], double weight[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_PCS(1);
 
-    V0[0] *= weight;
-    V1[0] *= weight;
-    V2[0] *= weight;
-    V3[0] *= weight;
-
-    ACCESS1(_WRtPlus1, 0);
-    ACCESS1(_WRtPlus1, 1);
-    ACCESS1(_WRtPlus1, 2);
-    ACCESS1(_WRtPlus1, 3);
+    WRITE1(0);
+    WRITE1(1);
+    WRITE1(2);
+    WRITE1(3);
 }
 
-static double
-mkname(_pcs_tuned_readout1) (PMeshPainter * painter, double pos[], double hsml)
+static void
+mkname(_pcs_tuned_readout1) (PMeshPainter * painter, double pos[], double value[], double hsml)
 {
-    FLOAT * canvas = painter->canvas;
-
     SETUP_KERNEL_PCS(1);
 
-    double value = 0;
-
-    value += ACCESS1(_REd1, 0);
-    value += ACCESS1(_REd1, 1);
-    value += ACCESS1(_REd1, 2);
-    value += ACCESS1(_REd1, 3);
-    return value;
+    READ1(0);
+    READ1(1);
+    READ1(2);
+    READ1(3);
 }
 static int
 mkname(_getfastmethod_pcs) (PMeshPainter * painter, PMeshWindowInfo * window, paintfunc * fastpaint, readoutfunc * fastreadout)
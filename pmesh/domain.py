@@ -104,6 +104,26 @@ class Layout(object):
         self.newlength = self.recvcounts.sum()
 
         self.indices = indices
+        self.order = None
+
+    def reorder(self, order):
+        """
+        Set the order of the delievered items.
+
+        After this, :py:meth:`exchange` returns the items in this order, and
+        :py:meth:`gather` expects the data in this order. Useful to arrange
+        the particles for locality, e.g. along a space filling curve.
+
+        Parameters
+        ----------
+        order : array_like or None
+            a permutation of range(newlength); None for the order of arrival.
+        """
+        if order is not None:
+            order = numpy.asarray(order, dtype='intp')
+            if len(order) != self.newlength:
+                raise ValueError("the length of order does not match the number of delievered items")
+        self.order = order
 
     def exchange(self, data):
         """ 
@@ -157,6 +177,9 @@ class Layout(object):
                             (recvbuffer, (self.recvcounts, self.recvoffsets), dt))
         dt.Free()
         self.comm.Barrier()
+
+        if self.order is not None:
+            recvbuffer = recvbuffer.take(self.order, axis=0)
         return recvbuffer
 
     def gather(self, data, mode='sum', out=None):
@@ -197,6 +220,12 @@ class Layout(object):
 
         dtype = numpy.dtype((data.dtype, data.shape[1:]))
 
+        if self.order is not None:
+            # back to the order of arrival
+            unordered = numpy.empty(len(data), dtype=dtype)
+            unordered[self.order] = data
+            data = unordered
+
         if mode == 'local':
             self.comm.Barrier()
             # drop all ghosts communication is not needed
@@ -527,7 +556,8 @@ class GridND(object):
         smoothing : float, or array_like
             Smoothing of particles. Any particle that intersects a domain will
             be transported to the domain. Smoothing is in the coordinate system
-            of the edges. if array_like, smoothing per dimension.
+            of the edges. if array_like of shape (ndim,), smoothing per dimension;
+            if of shape (Npoint, 1) or (Npoint, ndim), smoothing per particle.
 
         transform : callable
             Apply the transformation on pos before the decompostion.
@@ -544,15 +574,21 @@ class GridND(object):
         assert len(pos) < 1024 * 1024 * 1024 * 2
         pos = numpy.asarray(pos)
 
-        _smoothing = smoothing
-        smoothing = numpy.empty(self.ndim, dtype='f8')
-        smoothing[:] = _smoothing
-
         assert pos.shape[1] >= self.ndim
 
         if transform is None:
             transform = lambda x: x
         Npoint = len(pos)
+
+        _smoothing = numpy.asarray(smoothing, dtype='f8')
+        if _smoothing.ndim == 2:
+            # per particle
+            if len(_smoothing) != Npoint:
+                raise ValueError("smoothing per particle must be of shape (Npoint, 1) or (Npoint, ndim)")
+            smoothing = numpy.broadcast_to(_smoothing, (Npoint, self.ndim))
+        else:
+            smoothing = numpy.empty((1, self.ndim), dtype='f8')
+            smoothing[0, :] = _smoothing
         counts = numpy.zeros(self.comm.size, dtype='int32')
         periodic = self.periodic
 
@@ -565,11 +601,12 @@ class GridND(object):
                 chunk = transform(pos[s])
                 for j in range(self.ndim):
                     tmp = chunk[:, j]
+                    sm = smoothing[s, j] if len(smoothing) > 1 else smoothing[0, j]
                     if periodic:
                         boxsize = self.edges[j][-1]
                         c = tmp % boxsize
-                        l = self._digitize((c - smoothing[j]) % boxsize, self.edges[j], right=False)
-                        r = self._digitize((c + smoothing[j]) % boxsize, self.edges[j], right=False)
+                        l = self._digitize((c - sm) % boxsize, self.edges[j], right=False)
+                        r = self._digitize((c + sm) % boxsize, self.edges[j], right=False)
                         p = self._digitize(c, self.edges[j], right=False)
                         l = p - (p - l) % self.shape[j] - 1
                         r = p + (r - p) % self.shape[j]
@@ -577,8 +614,8 @@ class GridND(object):
                         sil[j, s] = l
                         sir[j, s] = r
                     else:
-                        l = self._digitize(tmp - smoothing[j], self.edges[j], right=False)
-                        r = self._digitize(tmp + smoothing[j], self.edges[j], right=False)
+                        l = self._digitize(tmp - sm, self.edges[j], right=False)
+                        r = self._digitize(tmp + sm, self.edges[j], right=False)
 
                         sil[j, s] = (l - 1).clip(0, self.shape[j])
                         sir[j, s] = r.clip(0, self.shape[j])
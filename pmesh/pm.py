@@ -71,6 +71,8 @@ from mpi4py import MPI
 import numbers # for testing Numbers
 import warnings
 import functools
+import contextlib
+import weakref
 from collections import OrderedDict
 
 _gettype = type
@@ -91,7 +93,7 @@ class slabiter(object):
             self.optx = [xx[None, ...] for xx in field.x]
             self.opti = [ii[None, ...] for ii in field.i]
         else:
-            axissort = numpy.argsort(field.value.strides)[::-1]
+            axissort = numpy.argsort(field._value.strides)[::-1]
             axis = axissort[0]
 
             self.optimized_view = value.transpose(axissort)
@@ -116,6 +118,32 @@ class slabiter(object):
             s.Nmesh = self.Nmesh
             yield s
 
+class blockiter(slabiter):
+    """ iterating will yield blocks of up to nblock slabs along the slowest axis,
+        or the full local array if nblock is None. The slowest axis is kept;
+        the coordinates of a block are attached as .x and .i. """
+    def __init__(self, field, value, nblock):
+        slabiter.__init__(self, field, value)
+        if nblock is None:
+            nblock = self.nslabs
+        self.nblock = max(nblock, 1)
+
+    def _coords(self, optx, sl):
+        kk = xslab([x if d != self.axis else x[sl] for d, x in enumerate(optx)])
+        kk.BoxSize = self.BoxSize
+        kk.Nmesh = self.Nmesh
+        return kk
+
+    def __iter__(self):
+        for start in range(0, self.nslabs, self.nblock):
+            sl = slice(start, start + self.nblock)
+            s = self.optimized_view[sl].view(type=slab)
+            s.x = self._coords(self.optx, sl)
+            s.i = self._coords(self.opti, sl)
+            s.BoxSize = self.BoxSize
+            s.Nmesh = self.Nmesh
+            yield s
+
 class xslab(list):
     def normp(self, p=2, zeromode=None):
         """ returns the p-norm of the vector, matching the broadcast shape.
@@ -174,6 +202,9 @@ class Field(NDArrayLike):
             if not isinstance(x, self._HANDLED_TYPES + (Field,)):
                 return NotImplemented
 
+        if self.pm._lazy and method == '__call__' and not out:
+            return LazyField(ufunc, inputs, kwargs, self)
+
         # Defer to the implementation of the ufunc on unwrapped values.
         inputs = tuple(x.value if isinstance(x, Field) else x
                        for x in inputs)
@@ -214,15 +245,33 @@ class Field(NDArrayLike):
     def copy(self):
         return self.pm.create(_gettype(self), value=self.value)
 
+    def lazy(self):
+        """ A :py:class:`LazyField` of self; arithmetic on it is deferred
+            until :py:meth:`LazyField.compute`.
+
+            .. code::
+
+                r = (a.lazy() * 2 + b * c).compute()
+
+        """
+        return LazyField(None, (self,), {}, self)
+
     def __init__(self, pm, base=None):
         """ Used internally to add shortcuts of attributes from pm """
 
         partition = pm._get_partition(type(self))
 
+        # no one else can see the memory of a new buffer; see _rescale
+        self._private = base is None
+        self._scale = 1.0
+
+        if base is None and pm.pool is not None:
+            base = pm.pool.get(partition)
+
         # create a new base object based on the given base object
         base = pfft.LocalBuffer(partition, base=base)
 
-        self._base = base
+        self._buffer = base
         self.pm = pm
         self._partition = partition
         self.BoxSize = pm.BoxSize
@@ -230,28 +279,23 @@ class Field(NDArrayLike):
         self.ndim = len(pm.Nmesh)
 
         if isinstance(self, RealField):
-            self.value = base.view_input()
+            self._value = base.view_input()
             self.start = partition.local_i_start
             self.cshape = numpy.array([e[-1] for e in partition.i_edges], dtype='intp')
         elif isinstance(self, (TransposedComplexField, UntransposedComplexField)):
-            self.value = base.view_output()
+            self._value = base.view_output()
             self.start = partition.local_o_start
             self.cshape = numpy.array([e[-1] for e in partition.o_edges], dtype='intp')
-            self.real = self.value.real
-            self.imag = self.value.imag
-            self.plain = self.value.view(dtype=(self.real.dtype, 2))
         else:
             raise TypeError("Only RealField and ComplexField. No more subclassing");
 
-        self.x = pm.create_coords(type(self), return_indices=False)
-        self.i = pm.create_coords(type(self), return_indices=True)
+        # shared by all fields of the type, read-only
+        self.x, self.i = pm._get_coords(type(self))
 
         # copy over a few ndarray attributes
-        self.flat = self.value.flat
-
-        self.shape = self.value.shape
-        self.size = self.value.size
-        self.dtype = self.value.dtype
+        self.shape = self._value.shape
+        self.size = self._value.size
+        self.dtype = self._value.dtype
 
         # the slices in the full array
         self.slices = tuple([
@@ -259,7 +303,46 @@ class Field(NDArrayLike):
                 for s, n in zip(self.start, self.shape)
                 ])
 
-        self.csize = pm.comm.allreduce(self.size)
+        # the global size; no need for a collective.
+        self.csize = int(numpy.prod(self.cshape))
+
+    @property
+    def value(self):
+        """ The local array of the field.
+
+            A pending scale factor (see :py:meth:`_rescale`) is applied to the array first;
+            afterwards the array may be shared, and the field is no longer rescaled lazily.
+        """
+        self._expose()
+        return self._value
+
+    @property
+    def _base(self):
+        """ The pfft.LocalBuffer of the field, for sharing the memory with base=. """
+        self._expose()
+        return self._buffer
+
+    def _expose(self):
+        if self._scale != 1.0:
+            self._value[...] *= self._scale
+            self._scale = 1.0
+        self._private = False
+
+    def _rescale(self, factor):
+        """ Multiply the field by factor.
+
+            If the buffer has never been handed out, the factor is recorded as a pending
+            scale instead of sweeping the array; the array is then self._value * self._scale,
+            and the factor is folded into the next transform, apply or reduction.
+        """
+        if self._private:
+            self._scale *= factor
+        else:
+            self._value[...] *= factor
+
+    @property
+    def flat(self):
+        return self.value.flat
 
     def _ctol(self, index):
         oldindex = index
@@ -518,25 +601,18 @@ class Field(NDArrayLike):
         complex[mask] = data
 
         # ensure the down sample is real
-        for i, slab in zip(complex.slabs.i, complex.slabs):
-            mask = functools.reduce(numpy.bitwise_and,
-                 [(n - ii) % n == ii
-                    for ii, n in zip(i, complex.Nmesh)])
-            slab.imag[mask] = 0
-
-            # remove the nyquist of the output
-            # FIXME: the nyquist is messy due to hermitian constraints
-            # let's do not touch them till we know they are important.
-            mask = functools.reduce(numpy.bitwise_or,
-                 [ ii == n // 2
-                   for ii, n in zip(i, complex.Nmesh)])
-            slab[mask] = 0
-
-            # also remove the nyquist of the input
-            mask = functools.reduce(numpy.bitwise_or,
-                 [ ii == n // 2
-                   for ii, n in zip(i, self.Nmesh)])
-            slab[mask] = 0
+        complex.value.imag[out.pm.get_kspace('selfconj', TransposedComplexField)] = 0
+
+        # remove the nyquist of the output
+        # FIXME: the nyquist is messy due to hermitian constraints
+        # let's do not touch them till we know they are important.
+        complex.value[out.pm.get_kspace('nyquist', TransposedComplexField)] = 0
+
+        # also remove the nyquist of the input
+        mask = functools.reduce(numpy.bitwise_or,
+             [ ii == n // 2
+               for ii, n in zip(complex.i, self.Nmesh)])
+        complex.value[mask] = 0
 
         if isinstance(out, RealField):
             complex.c2r(out)
@@ -611,7 +687,7 @@ class Field(NDArrayLike):
         self.pm.comm.Allreduce(MPI.IN_PLACE, result)
         return result
 
-    def apply(self, func, kind, out):
+    def apply(self, func, kind, out, nslabs=1):
         """ implements all kinds of apply operations. see subclass members for documentation"""
         if out is None:
             out = self.pm.create(type=_gettype(self))
@@ -619,15 +695,35 @@ class Field(NDArrayLike):
         if is_inplace(out):
             out = self
 
+        # the pending scale of self is applied slab by slab.
+        scale = self._scale
+        value = self._value
+
         if isinstance(out, numpy.ndarray):
-            assert out.shape == self.value.shape
-            outslabs = slabiter(self, out)
+            assert out.shape == value.shape
+            outvalue = out
         else:
             assert isinstance(out, _gettype(self))
-            assert out.value.shape == self.value.shape
-            outslabs = slabiter(self, out.value)
+            assert out._value.shape == value.shape
+            # out is fully overwritten.
+            out._scale = 1.0
+            outvalue = out._value
+
+        if nslabs == 1:
+            slabs = slabiter(self, value)
+            items = zip(slabs.x, slabs.i, slabs, slabiter(self, outvalue))
+        else:
+            blocks = blockiter(self, value, nslabs)
+            outblocks = blockiter(self, outvalue, nslabs)
+            items = ((b.x, b.i, b, o) for b, o in zip(blocks, outblocks))
+
+        for x, i, islab, oslab in items:
+            if scale != 1.0:
+                # keep the attributes of the slab, e.g. BoxSize, x and i.
+                scaled = (islab * scale).view(type=slab)
+                scaled.__dict__.update(islab.__dict__)
+                islab = scaled
 
-        for x, i, islab, oslab in zip(self.slabs.x, self.slabs.i, self.slabs, outslabs):
             if kind == 'relative':
                 oslab[...] = func(x, islab)
             elif kind == 'index':
@@ -649,10 +745,18 @@ class RealField(Field):
     def __init__(self, pm, base=None):
         Field.__init__(self, pm, base)
 
-    def r2c(self, out=None):
+    def r2c(self, out=None, compensation=None):
         """
         Perform real to complex transformation.
 
+        Parameters
+        ----------
+        compensation : None, True, string or ResampleWindow
+            If given, the Fourier window of the resampler (True for `pm.resampler`) is
+            deconvolved in the same pass as the normalization; this is equivalent to
+            `r2c().apply(resampler.get_compensation(), kind='circular')`, using the
+            window tables cached on the ParticleMesh.
+
         """
         if out is None:
             out = TransposedComplexField(self.pm)
@@ -661,7 +765,7 @@ class RealField(Field):
             out = self
 
         if out is self:
-            out = TransposedComplexField(self.pm, base=self._base)
+            out = TransposedComplexField(self.pm, base=self._buffer)
 
         assert isinstance(out, (BaseComplexField,))
 
@@ -669,9 +773,13 @@ class RealField(Field):
             # non-padded destroys input, so we fall back
             # to use the inplace transform
             # view out as self's type and copy the value
-            self = self.pm.create(type=type(self), value=self.value, base=out._base)
+            self = self.pm.create(type=type(self), value=self.value, base=out._buffer)
 
-        if self._base in out._base and out._base in self._base:
+        # the transform is linear; carry the pending scale of self over to out.
+        scale = self._scale
+
+        if self._buffer in out._buffer and out._buffer in self._buffer:
+            self._scale = 1.0
             # in place
             if isinstance(out, UntransposedComplexField):
                 plan = self.pm.plans['ipforwardU']
@@ -683,10 +791,18 @@ class RealField(Field):
             else:
                 plan = self.pm.plans['forwardT']
 
-        plan.execute(self._base, out._base)
+        # out is fully overwritten.
+        out._scale = 1.0
+
+        plan.execute(self._buffer, out._buffer)
 
         # PFFT normalization, same as FastPM
-        out.value[...] *= numpy.prod(self.Nmesh ** -1.0)
+        if compensation is None or compensation is False:
+            out._rescale(scale * numpy.prod(self.Nmesh ** -1.0))
+        else:
+            if compensation is True:
+                compensation = self.pm.resampler
+            self.pm._deconvolve(out._value, compensation, type(out), scale * numpy.prod(self.Nmesh ** -1.0))
 
         return out
 
@@ -724,8 +840,8 @@ class RealField(Field):
         if dtype is None:
             dtype = self.dtype
 
-        arg = numpy.argsort(self.value.strides)
-        sum1 = self.value.transpose(arg[::-1])
+        arg = numpy.argsort(self._value.strides)
+        sum1 = self._value.transpose(arg[::-1])
 
         # first sum along the axis with the shortest strides
         # this would usually mean stabler results
@@ -733,13 +849,14 @@ class RealField(Field):
         for d in range(self.ndim):
             sum1 = sum1.sum(axis=-1, dtype=dtype)
 
-        return self.pm.comm.allreduce(sum1)
+        return self.pm.comm.allreduce(sum1 * self._scale)
 
     def cmean(self, dtype=None):
         """ Collective mean. Mean of the entire mesh. (Must be called collectively)"""
         return self.csum(dtype=dtype) / self.csize
 
-    def readout(self, pos, hsml=None, out=None, resampler=None, transform=None, gradient=None, layout=None):
+    def readout(self, pos, hsml=None, out=None, resampler=None, transform=None, gradient=None, layout=None, nthreads=1,
+            plan=None):
         """
         Read out from real field at positions
 
@@ -760,6 +877,13 @@ class RealField(Field):
         layout : Layout
             domain decomposition to use for the readout. The position is first
             routed to the target ranks and the result is reduced
+        nthreads : int
+            number of threads used for the readout on each rank. The GIL is
+            released during the readout, so several readouts can run concurrently
+            from python threads.
+        plan : ResamplePlan or None
+            created by :py:meth:`ParticleMesh.resample_plan`. If given, the cached
+            kernel weights are replayed; pos, hsml, resampler, transform and layout are ignored.
 
         Returns
         -------
@@ -775,8 +899,15 @@ class RealField(Field):
 
         resampler = FindResampler(resampler)
 
+        if plan is not None:
+            if plan.layout is None:
+                return plan.readout(self.value, out=out, diffdir=gradient, nthreads=nthreads)
+            localresult = plan.readout(self.value, diffdir=gradient, nthreads=nthreads)
+            return plan.layout.gather(localresult, out=out)
+
         if layout is None:
-            return resampler.readout(self.value, pos, hsml=hsml, out=out, transform=transform, diffdir=gradient)
+            return resampler.readout(self.value, pos, hsml=hsml, out=out, transform=transform, diffdir=gradient,
+                    nthreads=nthreads)
         else:
             localpos = layout.exchange(pos)
             localhsml = exchange(layout, hsml)
@@ -784,11 +915,11 @@ class RealField(Field):
             localresult = self.readout(localpos, hsml=localhsml, resampler=resampler,
                     transform=transform,
                     gradient=gradient,
-                    out=None, layout=None)
+                    out=None, layout=None, nthreads=nthreads)
             return layout.gather(localresult, out=out)
 
     def readout_vjp(self, pos, v, resampler=None, transform=None, gradient=None,
-            out_self=None, out_pos=None, layout=None):
+            out_self=None, out_pos=None, layout=None, plan=None):
         """ back-propagate the gradient of readout.
 
             Returns a tuple of (out_self, out_pos), one of both can be False depending
@@ -826,7 +957,8 @@ class RealField(Field):
                 # need to create a copy of pos because we use it later.
                 pos = pos.copy()
             for d in range(pos.shape[1]):
-                self.readout(pos, out=out_pos[:, d], resampler=resampler, transform=transform, gradient=d, layout=layout)
+                self.readout(pos, out=out_pos[:, d], resampler=resampler, transform=transform, gradient=d, layout=layout,
+                        plan=plan)
                 out_pos[:, d] *= v
 
         if out_self is not False:
@@ -837,21 +969,24 @@ class RealField(Field):
 
             # watch out: do this after using self, because out_self can be self.
             self.pm.paint(pos, mass=v, resampler=resampler, transform=transform, gradient=gradient, hold=False,
-                    layout=layout, out=out_self)
+                    layout=layout, out=out_self, plan=plan)
 
         return out_self, out_pos
 
 
-    def readout_jvp(self, pos, v_self=None, v_pos=None, resampler=None, transform=None, gradient=None, layout=None):
+    def readout_jvp(self, pos, v_self=None, v_pos=None, resampler=None, transform=None, gradient=None, layout=None,
+            plan=None):
         """ f_i = W_qi A_q """
         jvp = numpy.zeros(len(pos))
 
         if v_pos is not None:
             for d in range(self.ndim):
-                jvp[...] += self.readout(pos, resampler=resampler, transform=transform, gradient=d, layout=layout) * v_pos[..., d]
+                jvp[...] += self.readout(pos, resampler=resampler, transform=transform, gradient=d, layout=layout,
+                        plan=plan) * v_pos[..., d]
 
         if v_self is not None:
-            jvp[...] += v_self.readout(pos, resampler=resampler, transform=transform, gradient=None, layout=layout)
+            jvp[...] += v_self.readout(pos, resampler=resampler, transform=transform, gradient=None, layout=layout,
+                    plan=plan)
 
         return jvp
 
@@ -863,10 +998,10 @@ class RealField(Field):
         """ Back-propagate the gradient of c2r from self to out """
         out = v.r2c(out)
         # PFFT normalization, same as FastPM
-        out.value[...] *= numpy.prod(out.pm.Nmesh ** 1.0)
+        out._rescale(numpy.prod(out.pm.Nmesh ** 1.0))
         return out
 
-    def apply(self, func, kind="relative", out=None):
+    def apply(self, func, kind="relative", out=None, nslabs=1):
         """ apply a function to the field.
 
             Parameters
@@ -887,13 +1022,22 @@ class RealField(Field):
             out : array_like or Field, or None.
                 If provided, write into this object. Must be the same shape as self.
 
+            nslabs : int or None
+                number of slabs along the slowest axis passed to func per call.
+                None to pass the full local array in one call, which avoids the
+                python overhead per slab at the cost of full size temporaries in func.
+
         """
         assert kind in ['relative', 'index', 'absolute']
-        return Field.apply(self, func, kind, out)
+        return Field.apply(self, func, kind, out, nslabs)
 
     def cdot(self, other):
         self._check_compatible(other)
-        return self.pm.comm.allreduce(numpy.sum(self[...] * other[...]))
+        scale = self._scale
+        if isinstance(other, Field):
+            scale = scale * other._scale
+            other = other._value
+        return self.pm.comm.allreduce(numpy.sum(self._value * other[...]) * scale)
 
     def cnorm(self):
         return self.cdot(self)
@@ -902,17 +1046,17 @@ class BaseComplexField(Field):
     def __init__(self, pm, base=None):
         Field.__init__(self, pm, base)
 
-    def _expand_hermitian(self, i, y):
-        # is the field compressed?
-        if not self.compressed:
-            return y
+    @property
+    def real(self):
+        return self.value.real
 
-        y = y.copy()
-        # if a conjugate is not stored and not self, increase the weight
-        # because we shall add it.
-        mask = (i[-1] != 0) & (i[-1] != self.Nmesh[-1] // 2)
-        y += mask * y
-        return y
+    @property
+    def imag(self):
+        return self.value.imag
+
+    @property
+    def plain(self):
+        return self.value.view(dtype=(self.value.real.dtype, 2))
 
     def cnorm(self, metric=None, norm=lambda x: x.real **2 + x.imag**2):
         r"""compute the norm collectively. The conjugates are added too.
@@ -934,10 +1078,8 @@ class BaseComplexField(Field):
                 y *= metric(k)
             return y
 
-        return self.pm.comm.allreduce(self\
-                .apply(filter2)\
-                .apply(self._expand_hermitian, kind='index', out=Ellipsis)\
-                .value.sum())
+        weight = self.pm.get_kspace('hermitian', _gettype(self))
+        return self.pm.comm.allreduce((self.apply(filter2).value * weight).sum())
 
     def cdot(self, other, metric=None):
         r""" Collective inner product between the independent modes of two Complex Fields.
@@ -963,7 +1105,7 @@ class BaseComplexField(Field):
         r.value[...] = numpy.conj(r.value[...])
         r.value[...] *= self.value
 
-        r.apply(self._expand_hermitian, kind='index', out=Ellipsis)
+        r.value[...] *= self.pm.get_kspace('hermitian', _gettype(self))
 
         if metric is not None:
             r.apply(lambda k, y: y * metric(k.normp() ** 0.5), out=Ellipsis)
@@ -988,7 +1130,7 @@ class BaseComplexField(Field):
             out = self
 
         if out is self:
-            out = RealField(self.pm, self._base)
+            out = RealField(self.pm, self._buffer)
 
         assert isinstance(out, RealField)
 
@@ -997,9 +1139,13 @@ class BaseComplexField(Field):
             # to using an inplace transform
 
             # view out as self, and copy the value
-            self = self.pm.create(type=type(self), base=out._base, value=self.value)
+            self = self.pm.create(type=type(self), base=out._buffer, value=self.value)
+
+        # the transform is linear; carry the pending scale of self over to out.
+        scale = self._scale
 
-        if out._base in self._base and self._base in out._base:
+        if out._buffer in self._buffer and self._buffer in out._buffer:
+            self._scale = 1.0
             # inplace
             if isinstance(self, UntransposedComplexField):
                 plan = self.pm.plans['ipbackwardU']
@@ -1011,7 +1157,13 @@ class BaseComplexField(Field):
             else:
                 plan = self.pm.plans['backwardT']
 
-        plan.execute(self._base, out._base)
+        # out is fully overwritten.
+        out._scale = 1.0
+
+        plan.execute(self._buffer, out._buffer)
+
+        if scale != 1.0:
+            out._rescale(scale)
 
         return out
 
@@ -1019,7 +1171,7 @@ class BaseComplexField(Field):
         """ Back-propagate the gradient of r2c to self. """
         out = v.c2r(out)
         # PFFT normalization, same as FastPM
-        out.value[...] *= numpy.prod(out.pm.Nmesh ** -1.0)
+        out._rescale(numpy.prod(out.pm.Nmesh ** -1.0))
         return out
 
     def decompress_vjp(v, out=None):
@@ -1032,16 +1184,14 @@ class BaseComplexField(Field):
         if is_inplace(out):
             out = v
 
-        for i, a, b in zip(out.slabs.i, out.slabs, v.slabs):
-            # modes that are self conjugates do not gain a factor
-            mask = numpy.ones(a.shape, '?')
-            for ii, n in zip(i, out.Nmesh):
-               mask &= (n - ii) % n == ii
-            a[~mask] = 2 * b[~mask]
-            a[mask] = b[mask]
+        # modes that are self conjugates do not gain a factor
+        mask = out.pm.get_kspace('selfconj', _gettype(out))
+        selfconj = v.value[mask]
+        numpy.multiply(v.value, 2, out=out.value)
+        out.value[mask] = selfconj
         return out
 
-    def apply(self, func, kind="wavenumber", out=None):
+    def apply(self, func, kind="wavenumber", out=None, nslabs=1):
         """ apply a function to the field, in-place.
 
             Parameters
@@ -1062,9 +1212,53 @@ class BaseComplexField(Field):
 
             out : array_like or Field, or None.
                 If provided, write into this object. Must be the same shape as self.
+
+            nslabs : int or None
+                number of slabs along the slowest axis passed to func per call.
+                None to pass the full local array in one call, which avoids the
+                python overhead per slab at the cost of full size temporaries in func.
         """
         assert kind in ['wavenumber', 'circular', 'index']
-        return Field.apply(self, func, kind, out)
+        return Field.apply(self, func, kind, out, nslabs)
+
+    def pipe(self, *funcs, **kwargs):
+        """ apply a chain of transfer functions in a single pass over the local modes.
+
+            `self.pipe(f1, f2, f3)` is equivalent to `self.apply(f1).apply(f2).apply(f3)`,
+            but each slab is visited once, and no intermediate field is created.
+
+            Parameters
+            ----------
+            funcs : callables
+                func(k, y), as in :py:meth:`apply`; y is the value returned by the previous func.
+            kind : string
+                The kind of k, shared by all funcs. See :py:meth:`apply`.
+            out : Field, array_like, Ellipsis or None
+                If a RealField, the chain is evaluated directly into the transform buffer
+                of out, followed by an in-place c2r. Otherwise, as in :py:meth:`apply`.
+            nslabs : int or None
+                See :py:meth:`apply`.
+        """
+        kind = kwargs.pop('kind', 'wavenumber')
+        out = kwargs.pop('out', None)
+        nslabs = kwargs.pop('nslabs', 1)
+        if len(kwargs) > 0:
+            raise TypeError("unexpected keyword arguments %s" % list(kwargs.keys()))
+
+        def chain(k, y):
+            for func in funcs:
+                y = func(k, y)
+            return y
+
+        if isinstance(out, RealField):
+            if out._partition is self._partition:
+                complex = self.pm.create(type=_gettype(self), base=out._base)
+            else:
+                complex = None
+            complex = self.apply(chain, kind=kind, out=complex, nslabs=nslabs)
+            return complex.c2r(out=out)
+
+        return self.apply(chain, kind=kind, out=out, nslabs=nslabs)
 
 class UntransposedComplexField(BaseComplexField):
     """
@@ -1085,6 +1279,131 @@ class TransposedComplexField(BaseComplexField):
 # backward-compatbility, alias TranposedComplexField to ComplexField
 ComplexField = TransposedComplexField
 
+# target size of a block in the evaluation of LazyField.
+LAZY_BLOCK_NBYTES = 256 * 1024
+
+class LazyField(NDArrayLike):
+    """ A deferred expression of element-wise ufuncs on fields of the same type.
+
+        The expression is evaluated by :py:meth:`compute` in one pass over the
+        local array, a block of LAZY_BLOCK_NBYTES at a time, so the temporaries
+        are small and the operands are visited once.
+
+        LazyField objects are created by :py:meth:`Field.lazy`, or by arithmetic on
+        fields within :py:meth:`ParticleMesh.lazy`. Other attributes of a LazyField
+        are taken from the computed field.
+    """
+    _HANDLED_TYPES = (numpy.ndarray, numbers.Number)
+
+    def __init__(self, ufunc, inputs, kwargs, like):
+        self.ufunc = ufunc
+        self.inputs = inputs
+        self.kwargs = kwargs
+        self.like = like
+        self._result = None
+
+    def __repr__(self):
+        if self.ufunc is None:
+            return 'LazyField(%s)' % self.like.__class__.__name__
+        return 'LazyField(%s%s)' % (self.ufunc.__name__, repr(self.inputs))
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        out = kwargs.get('out', ())
+        for x in inputs + out:
+            if not isinstance(x, self._HANDLED_TYPES + (Field, LazyField)):
+                return NotImplemented
+            if isinstance(x, (Field, LazyField)) and x.shape != self.shape:
+                return NotImplemented
+
+        if method == '__call__' and not out:
+            return LazyField(ufunc, inputs, kwargs, self.like)
+
+        # anything else is evaluated right away.
+        inputs = tuple(x.compute() if isinstance(x, LazyField) else x for x in inputs)
+        if out:
+            kwargs['out'] = tuple(x.compute() if isinstance(x, LazyField) else x for x in out)
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    @property
+    def shape(self):
+        return self.like.shape
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.compute(), name)
+
+    def __getitem__(self, index):
+        return self.compute().__getitem__(index)
+
+    def __array__(self, dtype=None):
+        return numpy.asarray(self.compute(), dtype=dtype)
+
+    def _evaluate(self, index, axis):
+        def ev(x):
+            if isinstance(x, LazyField):
+                return x._evaluate(index, axis)
+            if isinstance(x, Field):
+                return x.value[index]
+            if isinstance(x, numpy.ndarray):
+                # broadcasting from the right
+                a = axis - (len(self.shape) - x.ndim)
+                if a >= 0 and x.shape[a] != 1:
+                    return x[index[len(self.shape) - x.ndim:]]
+            return x
+
+        if self.ufunc is None:
+            return ev(self.like)
+        return self.ufunc(*[ev(x) for x in self.inputs], **self.kwargs)
+
+    def compute(self, out=None):
+        """ Evaluate the expression.
+
+            Parameters
+            ----------
+            out : Field, or None
+                the field to write into, can be one of the operands.
+                If None, a new field of the type of the operands is created
+                (an array for boolean results), and returned by subsequent calls.
+
+        """
+        if out is None and self._result is not None:
+            return self._result
+
+        like = self.like
+        value = like.value
+        axis = numpy.argmax(value.strides)
+        rowsize = value.nbytes // max(value.shape[axis], 1)
+        nrows = max(LAZY_BLOCK_NBYTES // max(rowsize, 1), 1)
+
+        cache = out is None
+        if out is None:
+            result = None
+        elif isinstance(out, Field):
+            assert out.value.shape == value.shape
+            result = out.value
+        else:
+            raise TypeError("out must be a Field or None")
+
+        for start in range(0, max(value.shape[axis], 1), nrows):
+            index = (slice(None),) * axis + (slice(start, start + nrows),)
+            block = self._evaluate(index, axis)
+            if result is None:
+                if numpy.result_type(block) == numpy.dtype('?'):
+                    result = numpy.empty(value.shape, dtype='?')
+                else:
+                    out = like.pm.create(type=_gettype(like))
+                    result = out.value
+            result[index] = block
+
+        if out is None:
+            # boolean, cannot be reasonable Field objects
+            out = result
+
+        if cache:
+            self._result = out
+        return out
+
 def build_index(indices, fullshape):
     """
         Build a linear index array based on indices on an array of fullshape.
@@ -1222,9 +1541,152 @@ def _init_o_coords(partition, Nmesh, BoxSize, dtype):
     return k, o_ind
 
 
-from weakref import WeakValueDictionary
+# number of procmesh and plans kept per communicator, see _TemplateCache.
+PM_CACHE_SIZE = 8
+
+class _TemplateCache(object):
+    """ The procmesh and plans of ParticleMesh objects, keyed by the geometry of
+        the transforms; a least recently used cache of up to PM_CACHE_SIZE entries
+        per communicator.
+
+        ParticleMesh objects are created collectively, so the lookups and insertions
+        on a communicator are in the same order on all of its ranks; eviction is
+        within a communicator, thus the cache is always consistent between ranks.
+
+        The entries of a communicator are found by an id attached to it as an MPI
+        attribute. The cache holds no reference to the communicator, and the entries
+        are dropped when the communicator is freed.
+    """
+    def __init__(self):
+        self.comms = {}
+        self.keyval = None
+        self.nextid = 0
+
+    def _id(self, comm, create=False):
+        if self.keyval is None:
+            if not create:
+                return None
+            self.keyval = MPI.Comm.Create_keyval(delete_fn=self._delete)
+
+        cid = comm.Get_attr(self.keyval)
+        if cid is None and create:
+            # ids are local to the rank; they are never compared between ranks.
+            cid = self.nextid
+            self.nextid += 1
+            comm.Set_attr(self.keyval, cid)
+        return cid
+
+    def _delete(self, comm, keyval, cid):
+        self.comms.pop(cid, None)
+
+    def get(self, comm, key):
+        entries = self.comms.get(self._id(comm), {})
+        template = entries.pop(key, None)
+        if template is not None:
+            entries[key] = template
+        return template
+
+    def put(self, comm, key, template):
+        entries = self.comms.setdefault(self._id(comm, create=True), OrderedDict())
+        entries.pop(key, None)
+        entries[key] = template
+        while len(entries) > max(PM_CACHE_SIZE, 1):
+            entries.popitem(last=False)
+
+    def clear(self, comm=None):
+        """ Release the cached procmesh and plans, of comm or all communicators.
+            Shall be called collectively on comm, or on all ranks.
+        """
+        if comm is None:
+            self.comms.clear()
+        else:
+            self.comms.pop(self._id(comm), None)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.comms.values())
+
+_pm_cache = _TemplateCache()
+
+def clear_cache(comm=None):
+    """ Release the procmesh and plans cached for new ParticleMesh objects
+        on comm, or on all communicators if comm is None. Collective.
+    """
+    _pm_cache.clear(comm)
+
+# default bound on the memory of the derived k-space arrays cached per ParticleMesh.
+KSPACE_CACHE_NBYTES = 64 * 1024 * 1024
+
+class _BufferLease(pfft.LocalBuffer):
+    """ A pfft.LocalBuffer on the memory of a pooled buffer. Unlike pfft.LocalBuffer
+        it can be weakly referred, see BufferPool.get.
+    """
+    pass
 
-_pm_cache = WeakValueDictionary()
+class BufferPool(object):
+    """ A pool of pfft.LocalBuffer objects, recycled by partition.
+
+        The pool lends its buffers with :py:meth:`get`. A buffer returns to the pool
+        once the lease is collected, i.e. all fields and arrays using its memory
+        (including fields created with base=) have been garbage collected.
+        At most size buffers are kept; beyond that new buffers are not pooled.
+        Recycled buffers are not cleared.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.free = {}
+        self.nbuffers = 0
+        # the lent buffers, by a weak reference to their lease
+        self.leases = {}
+
+    def get(self, partition):
+        """ A buffer of partition on the memory of a free pooled buffer,
+            allocating one if none is free.
+        """
+        free = self.free.setdefault(partition, [])
+        if len(free) > 0:
+            buf = free.pop()
+        elif self.nbuffers < self.size:
+            buf = pfft.LocalBuffer(partition)
+            self.nbuffers += 1
+        else:
+            return pfft.LocalBuffer(partition)
+
+        # the fields and arrays on the memory all refer to the lease.
+        lease = _BufferLease(partition, base=buf)
+        self.leases[weakref.ref(lease, self._release)] = (partition, buf)
+        return lease
+
+    def _release(self, ref):
+        partition, buf = self.leases.pop(ref)
+        self.free.setdefault(partition, []).append(buf)
+
+    def clear(self):
+        # dropping the weak references also drops their callbacks.
+        self.leases.clear()
+        self.free.clear()
+        self.nbuffers = 0
+
+class _PlanCache(OrderedDict):
+    """ The partitions and plans of a ParticleMesh. The partitions are created
+        upfront, and a pair of forward and backward plans on first use of either.
+
+        Planning is collective, as are the transforms that trigger it.
+        The order of insertion implies ordered destruction.
+    """
+    def __init__(self, make_duo):
+        OrderedDict.__init__(self)
+        self.make_duo = make_duo
+
+    def __missing__(self, key):
+        for prefix in ['', 'ip']:
+            for suffix in ['T', 'U']:
+                if key in (prefix + 'forward' + suffix, prefix + 'backward' + suffix):
+                    fplan, bplan = self.make_duo(self['partition' + suffix],
+                        inplace=prefix == 'ip', transposed=suffix == 'T')
+                    self[prefix + 'forward' + suffix] = fplan
+                    self[prefix + 'backward' + suffix] = bplan
+                    return self[key]
+        raise KeyError(key)
 
 class _pmtemplate(object):
     # subclass tuple to ensure ordered destruction.
@@ -1355,33 +1817,19 @@ class ParticleMesh(object):
         Nmesh = self.Nmesh
         BoxSize = self.BoxSize
 
-        # if a similar ParticleMesh exists, use its
+        # if a ParticleMesh of the same geometry was created, use its
         # procmesh and plans,
         # this is to avoid creating too many MPI communicators,
         # which are a limited resource. (Intel has 16381, e.g.)
-        # also see below where the instance self is inserted
-        # to the weak dict.
-        # the use of _addressof(comm) should be OK,
-        # if we find a pm in the cache then the pm object
-        # must have been holding a reference to the comm, so it
-        # is alive.
-        # if we don't find a pm then we'll create a new one anyways.
-
-        _cache_args = (tuple(Nmesh), tuple(BoxSize),
-                       MPI._addressof(comm), comm.rank, comm.size,
-                       tuple(np), dtype, plan_method, paddedflag)
+        # also see below where the template is inserted
+        # to the cache. BoxSize and resampler do not matter.
+        # the cache is consistent between the ranks of comm, so
+        # no communication is needed to decide on a hit.
 
-        template = _pm_cache.get(_cache_args, None)
-
-        hastemplate = comm.allgather(template is not None)
-        if not all(hastemplate):
-            # some ranks the GC has already killed the cache; so we need to recreate
-            # everything
-            template = None
+        _cache_args = (tuple(Nmesh), comm.rank, comm.size,
+                       tuple(np), dtype, plan_method, paddedflag)
 
-#        if comm.rank == 0:
-#            print('hastemplate', hastemplate)
-#            print(template, type(template), _cache_args)
+        template = _pm_cache.get(comm, _cache_args)
 
         if template is not None:
             procmesh = template.procmesh
@@ -1397,24 +1845,27 @@ class ParticleMesh(object):
         if template is not None:
             plans = template.plans
         else:
-            plans = OrderedDict() # order dict implies ordered destruction.
-
-            def make_duo(inplace, transposed):
-
+            def make_partition(transposed):
                 if transposed:
                     partition_flags = pfft.Flags.PFFT_TRANSPOSED_OUT | paddedflag
-                    forward_flags = pfft.Flags.PFFT_TRANSPOSED_OUT | paddedflag
-                    backward_flags = pfft.Flags.PFFT_TRANSPOSED_IN | paddedflag
                 else:
                     partition_flags = paddedflag
-                    forward_flags = paddedflag
-                    backward_flags = paddedflag
 
-                partition = pfft.Partition(forward,
+                return pfft.Partition(forward,
                     Nmesh,
                     procmesh,
                     partition_flags)
 
+            def make_duo(partition, inplace, transposed):
+
+                if transposed:
+                    forward_flags = pfft.Flags.PFFT_TRANSPOSED_OUT | paddedflag
+                    backward_flags = pfft.Flags.PFFT_TRANSPOSED_IN | paddedflag
+                else:
+                    forward_flags = paddedflag
+                    backward_flags = paddedflag
+
+                # the buffers are only for planning; they are released on return.
                 bufferin = pfft.LocalBuffer(partition)
 
                 if not inplace:
@@ -1428,14 +1879,12 @@ class ParticleMesh(object):
                 bplan = pfft.Plan(partition, pfft.Direction.PFFT_BACKWARD,
                     bufferout, bufferin, backward,
                     plan_method  | backward_flags)
-                return partition, fplan, bplan
 
-            plans['partitionT'], plans['forwardT'], plans['backwardT'] = make_duo(False, True)
-            junk, plans['ipforwardT'], plans['ipbackwardT'] = make_duo(True, True)
+                return fplan, bplan
 
-            plans['partitionU'], plans['forwardU'], plans['backwardU'] = make_duo(False, False)
-            junk, plans['ipforwardU'], plans['ipbackwardU'] = make_duo(True, False)
-            del junk
+            plans = _PlanCache(make_duo)
+            plans['partitionT'] = make_partition(True)
+            plans['partitionU'] = make_partition(False)
 
         # use the transpsoed partition for configuration space edges
         partition = plans['partitionT']
@@ -1460,12 +1909,203 @@ class ParticleMesh(object):
         self.dtype = dtype
         self.plans = plans
 
+        # Fourier window tables per resampler and field type, see _get_fwindow
+        self._fwindow = {}
+
+        # opt-in recycling of field buffers, see enable_pool
+        self.pool = None
+
+        # coordinates per field type, shared by the fields, see _get_coords
+        self._coords = {}
+
+        # arithmetic of fields is deferred within the lazy context.
+        self._lazy = False
+
+        # derived k-space arrays, see get_kspace
+        self._kspace = OrderedDict()
+        self._kspace_nbytes = 0
+        self.kspace_cache_nbytes = KSPACE_CACHE_NBYTES
+
         if template is None:
             template = _pmtemplate(procmesh, plans)
 
         self.template = template
 
-        _pm_cache[_cache_args] = template
+        _pm_cache.put(comm, _cache_args, template)
+
+    def _get_coords(self, field_type):
+        """ The coordinates and indices of field_type as from create_coords;
+            cached, and read-only.
+        """
+        if field_type not in self._coords:
+            x = self.create_coords(field_type, return_indices=False)
+            i = self.create_coords(field_type, return_indices=True)
+            for a in x + i:
+                a.flags.writeable = False
+            self._coords[field_type] = (x, i)
+        return self._coords[field_type]
+
+    def _get_fwindow(self, resampler, field_type):
+        """ The 1d Fourier window of resampler along each direction,
+            on the local modes of field_type; cached per resampler and field type.
+        """
+        resampler = FindResampler(resampler)
+        field_type = _typestr_to_type(field_type)
+        key = (resampler.kind, resampler.support, field_type)
+        if key not in self._fwindow:
+            k = self._get_coords(field_type)[0]
+            self._fwindow[key] = [resampler.get_fwindow(ki * L / N)
+                    for ki, L, N in zip(k, self.BoxSize, self.Nmesh)]
+        return self._fwindow[key]
+
+    def enable_pool(self, size=8):
+        """ Recycle the buffers of fields that have been garbage collected.
+
+            Fields created by this ParticleMesh take their memory from a
+            :py:class:`BufferPool` of up to size buffers; size of 0 disables
+            the pool and releases the buffers.
+
+            Beware that a recycled buffer is not cleared, as with a newly allocated one.
+        """
+        if size > 0:
+            self.pool = BufferPool(size)
+        else:
+            self.pool = None
+
+    @contextlib.contextmanager
+    def lazy(self):
+        """ A context where the arithmetic of fields of this ParticleMesh
+            is deferred, resulting :py:class:`LazyField` objects. See :py:meth:`Field.lazy`.
+
+            .. code::
+
+                with pm.lazy():
+                    r = (a * 2 + b * c).compute(out=a)
+
+        """
+        lazy = self._lazy
+        self._lazy = True
+        try:
+            yield self
+        finally:
+            self._lazy = lazy
+
+    @contextlib.contextmanager
+    def scratch(self, size=8):
+        """ A context where temporary fields recycle their buffers.
+
+            If no pool is enabled, a pool of size buffers is used within the
+            context, and released on exit.
+
+            .. code::
+
+                with pm.scratch():
+                    for i in range(nsteps):
+                        force = [rhok.apply(transfer(d)).c2r() for d in range(pm.ndim)]
+
+        """
+        pool = self.pool
+        if pool is None:
+            self.pool = BufferPool(size)
+        try:
+            yield self
+        finally:
+            if pool is None:
+                self.pool.clear()
+            self.pool = pool
+
+    def get_kspace(self, name, type='complex'):
+        """ A derived quantity on the local modes of a complex field type.
+
+            The arrays are built on first use and kept in a least recently used
+            cache of at most `kspace_cache_nbytes` bytes per ParticleMesh;
+            larger arrays are not cached. The result is read-only and broadcasts
+            to the shape of the field value.
+
+            Parameters
+            ----------
+            name : string
+                'k2' : :math:`|k|^2`;
+                'knorm' : :math:`|k|`;
+                'hermitian' : the number of modes represented by a stored mode,
+                              2 if the conjugate is not stored, 1 otherwise;
+                'selfconj' : mask of modes that are their own conjugate;
+                'nyquist' : mask of modes on any Nyquist plane.
+            type : type or string
+                the complex field type.
+
+        """
+        field_type = _typestr_to_type(type)
+        if not issubclass(field_type, BaseComplexField):
+            raise TypeError("k-space quantities are only defined for complex fields")
+
+        key = (name, field_type)
+        if key in self._kspace:
+            value = self._kspace.pop(key)
+            self._kspace[key] = value
+            return value
+
+        if name == 'k2':
+            k = self._get_coords(field_type)[0]
+            value = sum(ki ** 2 for ki in k)
+        elif name == 'knorm':
+            value = self.get_kspace('k2', field_type) ** 0.5
+        elif name == 'hermitian':
+            i = self._get_coords(field_type)[1]
+            if numpy.dtype(self.dtype).kind == 'c':
+                # not compressed, all conjugates are stored.
+                value = numpy.ones_like(i[-1], dtype='f8')
+            else:
+                # if a conjugate is not stored and not self, increase the weight
+                # because we shall add it.
+                value = 1.0 + ((i[-1] != 0) & (i[-1] != self.Nmesh[-1] // 2))
+        elif name == 'selfconj':
+            i = self._get_coords(field_type)[1]
+            value = functools.reduce(numpy.bitwise_and,
+                 [(n - ii) % n == ii for ii, n in zip(i, self.Nmesh)])
+        elif name == 'nyquist':
+            i = self._get_coords(field_type)[1]
+            value = functools.reduce(numpy.bitwise_or,
+                 [ii == n // 2 for ii, n in zip(i, self.Nmesh)])
+        else:
+            raise ValueError("unknown k-space quantity %s" % name)
+
+        value.flags.writeable = False
+
+        if value.nbytes <= self.kspace_cache_nbytes:
+            self._kspace_nbytes += value.nbytes
+            while self._kspace_nbytes > self.kspace_cache_nbytes:
+                k, v = self._kspace.popitem(last=False)
+                self._kspace_nbytes -= v.nbytes
+            self._kspace[key] = value
+
+        return value
+
+    def _deconvolve(self, value, resampler, field_type, factor=1.0):
+        """ value *= factor / prod_d T_d, where T_d is the cached Fourier window
+            of resampler along direction d.
+
+            value is visited once, a slab at a time along the slowest axis.
+        """
+        a = numpy.argmax(value.strides)
+        v = numpy.moveaxis(value, a, 0)
+        slow = numpy.ones(v.shape[0])
+        rest = factor
+        for t in self._get_fwindow(resampler, field_type):
+            t = numpy.moveaxis(t, a, 0)
+            if t.shape[0] == 1:
+                rest = rest / t
+            else:
+                slow = slow / t.reshape(-1)
+
+        if numpy.ndim(rest) > 0:
+            rest = rest[0]
+
+        if value.ndim == 1:
+            v[...] *= slow * rest
+        else:
+            for i in range(v.shape[0]):
+                v[i] *= slow[i] * rest
 
     def _get_partition(self, field_type):
         if issubclass(field_type, RealField):
@@ -1731,7 +2371,7 @@ class ParticleMesh(object):
 
         return source, id
 
-    def decompose(self, pos, smoothing=None, transform=None):
+    def decompose(self, pos, smoothing=None, transform=None, order=None, hsml=None):
         """
         Create a domain decompose layout for particles at given
         coordinates.
@@ -1746,6 +2386,20 @@ class ParticleMesh(object):
             This is the size of the buffer region around a domain.
             Default: None, use self.resampler
 
+        order : None, 'morton', or array_like
+            order of the particles delievered by the layout; see :py:meth:`domain.Layout.reorder`.
+            'morton' sorts the local particles along a space filling curve (:py:meth:`sfc_argsort`),
+            such that paint and readout access the mesh with good locality.
+            An array (e.g. `layout.order` of a previous step) is reused as is,
+            as long as the number of local particles is unchanged on all ranks;
+            otherwise it is recomputed. None for the order of arrival.
+
+        hsml : None or array_like
+            scaling of the kernel per particle, as in :py:meth:`paint`. If given, smoothing
+            must be a window; the buffer region of a particle is half of its integer support
+            (:py:meth:`window.ResampleWindow.get_support`), such that
+            particles of small hsml are not copied to more ranks than necessary.
+
         Returns
         -------
         layout  : :py:class:domain.Layout
@@ -1755,11 +2409,16 @@ class ParticleMesh(object):
         if smoothing is None:
             smoothing = self.resampler
 
-        try:
+        if hsml is not None:
             smoothing = FindResampler(smoothing)
-            smoothing = smoothing.support * 0.5
-        except TypeError:
-            pass
+            hsml = numpy.broadcast_to(numpy.asfarray(hsml), len(pos))
+            smoothing = smoothing.get_support(hsml)[:, None] * 0.5
+        else:
+            try:
+                smoothing = FindResampler(smoothing)
+                smoothing = smoothing.support * 0.5
+            except TypeError:
+                pass
 
         if transform is None:
             transform = self.affine
@@ -1769,10 +2428,75 @@ class ParticleMesh(object):
             # shift is local per processor, thus do not use it.
             return transform.scale * x
 
-        return self.domain.decompose(pos, smoothing=smoothing,
+        layout = self.domain.decompose(pos, smoothing=smoothing,
                 transform=transform0)
 
-    def paint(self, pos, hsml=None, mass=1.0, resampler=None, transform=None, hold=False, gradient=None, layout=None, out=None):
+        if order is None:
+            return layout
+
+        if not isinstance(order, str):
+            # a stale order is still correct, only less local.
+            if not all(self.comm.allgather(len(order) == layout.newlength)):
+                order = 'morton'
+
+        if isinstance(order, str):
+            if order != 'morton':
+                raise ValueError("order must be None, 'morton' or an array")
+            # the keys only depend on the position; route them instead of the positions.
+            key = layout.exchange(self.sfc_key(pos, transform=transform))
+            order = key.argsort(kind='mergesort')
+
+        layout.reorder(order)
+        return layout
+
+    def sfc_argsort(self, pos, transform=None):
+        """
+        Returns the permutation that sorts particles along a Morton (Z-order)
+        space filling curve on the mesh cells.
+
+        Parameters
+        ----------
+        pos    : array_like (, ndim)
+            position of particles in simulation  unit
+
+        """
+        return self.sfc_key(pos, transform=transform).argsort(kind='mergesort')
+
+    def sfc_key(self, pos, transform=None):
+        """
+        Returns the Morton (Z-order) key of the mesh cells of particles, as uint64.
+
+        Parameters
+        ----------
+        pos    : array_like (, ndim)
+            position of particles in simulation  unit
+
+        """
+        if transform is None:
+            transform = self.affine
+
+        pos = numpy.asarray(pos)
+        Nmesh = numpy.array(transform.period, dtype='i8')
+        Nmesh[Nmesh == 0] = self.Nmesh[Nmesh == 0]
+
+        cell = numpy.int64(numpy.floor(pos * transform.scale)) % Nmesh
+
+        # keep the key in 63 bits; coarser cells along the curve if the mesh is huge.
+        nbits = int(numpy.ceil(numpy.log2(max(Nmesh.max(), 2))))
+        drop = max(nbits - 63 // self.ndim, 0)
+        cell >>= drop
+        nbits -= drop
+
+        key = numpy.zeros(len(pos), dtype='u8')
+        for b in range(nbits):
+            for d in range(self.ndim):
+                bit = numpy.uint64((cell[:, d] >> b) & 1)
+                key |= bit << numpy.uint64(b * self.ndim + self.ndim - 1 - d)
+
+        return key
+
+    def paint(self, pos, hsml=None, mass=1.0, resampler=None, transform=None, hold=False, gradient=None, layout=None, out=None,
+            nthreads=1, strategy='tile', plan=None):
         """
         Paint particles into the internal real canvas.
 
@@ -1795,8 +2519,10 @@ class ParticleMesh(object):
             scaling of the resampling window per particle; or None for the kernel intrinsic size.
             (dimensionless)
 
-        mass   : scalar or array_like (,)
-            mass of particles in simulation unit
+        mass   : scalar or array_like (,) or (, m)
+            mass of particles in simulation unit. If two dimensional,
+            column i is painted to the i-th field of out, and the window
+            is evaluated only once per particle.
 
         hold   : bool
             If true, do not clear the current value in the field.
@@ -1812,6 +2538,20 @@ class ParticleMesh(object):
             domain decomposition to use for the readout. The position is first
             routed to the target ranks and the result is reduced
 
+        out : RealField, list of RealField, or None
+            A list of fields to paint m mass components in one pass;
+            None to create a new field (or a list of m fields if mass is two dimensional).
+
+        nthreads : int
+            number of threads used for painting on each rank.
+
+        strategy : string
+            'tile' or 'private'; see :py:meth:`pmesh.window.ResampleWindow.paint`.
+
+        plan : ResamplePlan or None
+            created by :py:meth:`ParticleMesh.resample_plan`. If given, the cached
+            kernel weights are replayed; pos, hsml, resampler, transform and layout are ignored.
+
         Notes
         -----
         the painter operation conserves the total mass. It is not the density.
@@ -1827,13 +2567,30 @@ class ParticleMesh(object):
         resampler = FindResampler(resampler)
 
         if out is None:
-            out = self.create(type=RealField)
+            if numpy.ndim(mass) == 2:
+                out = [self.create(type=RealField) for i in range(numpy.shape(mass)[1])]
+            else:
+                out = self.create(type=RealField)
+
+        if isinstance(out, (list, tuple)):
+            out = list(out)
+            real = [o.value for o in out]
+        else:
+            real = out.value
 
         if not hold:
-            out.value[...] = 0
+            for r in (real if isinstance(real, list) else [real]):
+                r[...] = 0
+
+        if plan is not None:
+            if plan.layout is not None:
+                mass = exchange(plan.layout, mass)
+            plan.paint(real, mass=mass, diffdir=gradient, nthreads=nthreads, strategy=strategy)
+            return out
 
         if layout is None:
-            resampler.paint(out.value, pos, hsml=hsml, mass=mass, transform=transform, diffdir=gradient)
+            resampler.paint(real, pos, hsml=hsml, mass=mass, transform=transform, diffdir=gradient,
+                    nthreads=nthreads, strategy=strategy)
             return out
         else:
             localpos = layout.exchange(pos)
@@ -1846,10 +2603,180 @@ class ParticleMesh(object):
                     transform=transform,
                     hold=hold,
                     gradient=gradient,
-                    layout=None, out=out)
+                    layout=None, out=out,
+                    nthreads=nthreads, strategy=strategy)
+
+    def paint_interlaced(self, pos, hsml=None, mass=1.0, resampler=None, transform=None, layout=None,
+            compensation=False, out=None, nthreads=1, strategy='tile'):
+        """
+        Paint particles onto two meshes offset by half a cell, and combine
+        them in Fourier space to suppress the aliasing of the window.
+
+        The second mesh is painted with the transform shifted by half a cell;
+        its Fourier modes are phase shifted back by :math:`e^{i k H / 2}` and averaged
+        with the first mesh, which cancels the odd images of the window.
+        A low order window (e.g. CIC) painted interlaced is often as good as
+        a much more expensive high order window.
+
+        Parameters
+        ----------
+        pos, hsml, mass, resampler, transform, nthreads, strategy :
+            see :py:meth:`paint`; mass must be one dimensional.
+
+        layout : Layout
+            see :py:meth:`paint`. The shifted mesh reaches half a cell further,
+            thus the layout shall be created with a larger smoothing, e.g.
+            `pm.decompose(pos, smoothing=resampler.support * 0.5 + 0.5)`.
+
+        compensation : bool, string or ResampleWindow
+            if True, also deconvolve the window of resampler; see :py:meth:`RealField.r2c`.
+
+        out : ComplexField or None
+            the output; a new ComplexField if None.
+
+        Returns
+        -------
+        out : ComplexField
+            the interlaced field in Fourier space, normalized as :py:meth:`RealField.r2c`.
+        """
+        if resampler is None:
+            resampler = self.resampler
+
+        resampler = FindResampler(resampler)
+
+        if transform is None:
+            transform = self.affine
+
+        if layout is not None:
+            pos = layout.exchange(pos)
+            mass = exchange(layout, mass)
+            hsml = exchange(layout, hsml)
+
+        if compensation is True:
+            compensation = resampler
+        elif compensation is False:
+            compensation = None
+
+        real = self.paint(pos, hsml=hsml, mass=mass, resampler=resampler, transform=transform,
+                nthreads=nthreads, strategy=strategy)
+        c1 = real.r2c(out=out, compensation=compensation)
+
+        real = self.paint(pos, hsml=hsml, mass=mass, resampler=resampler, transform=transform.shift(0.5),
+                out=real, nthreads=nthreads, strategy=strategy)
+        c2 = real.r2c(out=Ellipsis, compensation=compensation)
+
+        H = self.BoxSize / self.Nmesh
+        for k, s1, s2 in zip(c1.slabs.x, c1.slabs, c2.slabs):
+            kH = sum(ki * Hi for ki, Hi in zip(k, H))
+            s1[...] = s1 * 0.5 + s2 * (0.5 * numpy.exp(0.5j * kH))
+
+        return c1
+
+    def readout_many(self, fields, pos, hsml=None, out=None, resampler=None, transform=None, gradient=None, layout=None,
+            nthreads=1, plan=None):
+        """
+        Read out from several real fields at the same positions.
+
+        The positions are routed through the layout once, the window is evaluated
+        once per particle and the results are gathered in one pass.
+
+        Parameters
+        ----------
+        fields : list of RealField
+            fields to read out from; must be on this ParticleMesh.
+        pos    : array_like (, ndim)
+            position of particles in simulation  unit
+        out : array_like (, len(fields)), or None
+            output
+        layout : Layout
+            domain decomposition to use for the readout. The position is first
+            routed to the target ranks and the result is reduced
+
+        See :py:meth:`RealField.readout` for the other arguments, including plan.
+
+        Returns
+        -------
+        rt     : array_like (, len(fields))
+            column i is read out from fields[i].
+
+        """
+        for field in fields:
+            assert isinstance(field, RealField)
+            assert field.pm is self
+
+        if not transform:
+            transform = self.affine
+
+        if resampler is None:
+            resampler = self.resampler
+
+        resampler = FindResampler(resampler)
+
+        values = [field.value for field in fields]
+        if plan is not None:
+            if plan.layout is None:
+                return plan.readout(values, out=out, diffdir=gradient, nthreads=nthreads)
+            localresult = plan.readout(values, diffdir=gradient, nthreads=nthreads)
+            return plan.layout.gather(localresult, out=out)
+
+        if layout is None:
+            return resampler.readout(values, pos, hsml=hsml, out=out,
+                    transform=transform, diffdir=gradient, nthreads=nthreads)
+        else:
+            localpos = layout.exchange(pos)
+            localhsml = exchange(layout, hsml)
+
+            localresult = self.readout_many(fields, localpos, hsml=localhsml, resampler=resampler,
+                    transform=transform,
+                    gradient=gradient,
+                    out=None, layout=None, nthreads=nthreads)
+            return layout.gather(localresult, out=out)
+
+
+    def resample_plan(self, pos, hsml=None, resampler=None, transform=None, layout=None, derivative=False, dtype='f8',
+            nthreads=1):
+        """
+        Create a plan that caches the base cells and the 1d kernel weights of particles.
+
+        Pass the plan to :py:meth:`paint`, :py:meth:`RealField.readout` or :py:meth:`readout_many`
+        to replay the weights without evaluating the window again; the positions are
+        routed through layout only once, here.
+
+        Parameters
+        ----------
+        pos    : array_like (, ndim)
+            position of particles in simulation unit
+        layout : Layout
+            domain decomposition to route the particles with.
+        derivative : bool
+            also cache the weights of the derivative of the window, for gradient != None.
+        dtype : dtype
+            'f4' to store the weights in single precision.
+
+        Returns
+        -------
+        plan : :py:class:`pmesh.window.ResamplePlan`
+
+        """
+        if not transform:
+            transform = self.affine
+
+        if resampler is None:
+            resampler = self.resampler
+
+        resampler = FindResampler(resampler)
+
+        if layout is not None:
+            pos = layout.exchange(pos)
+            hsml = exchange(layout, hsml)
 
+        plan = resampler.plan(pos, hsml=hsml, transform=transform, derivative=derivative, dtype=dtype,
+                nthreads=nthreads)
+        plan.layout = layout
+        return plan
 
-    def paint_jvp(self, pos, mass=1.0, v_pos=None, v_mass=None, resampler=None, transform=None, gradient=None, layout=None, out=None):
+    def paint_jvp(self, pos, mass=1.0, v_pos=None, v_mass=None, resampler=None, transform=None, gradient=None, layout=None, out=None,
+            plan=None):
         """ A_q = W_qi M_i """
         assert gradient is None # second order is not supported yet
 
@@ -1860,15 +2787,15 @@ class ParticleMesh(object):
         if v_pos is not None:
             for d in range(pos.shape[1]):
                 self.paint(pos, mass=v_pos[..., d] * mass,
-                    resampler=resampler, transform=transform, gradient=d, hold=True, layout=layout, out=out)
+                    resampler=resampler, transform=transform, gradient=d, hold=True, layout=layout, out=out, plan=plan)
 
         if v_mass is not None:
             self.paint(pos, mass=v_mass,
-                resampler=resampler, transform=transform, gradient=None, hold=True, layout=layout, out=out)
+                resampler=resampler, transform=transform, gradient=None, hold=True, layout=layout, out=out, plan=plan)
         return out
 
     def paint_vjp(self, v, pos, mass=1.0, resampler=None, transform=None, gradient=None,
-            out_pos=None, out_mass=None, layout=None):
+            out_pos=None, out_mass=None, layout=None, plan=None):
         """ back-propagate the gradient of paint from v.
 
             Parameters
@@ -1902,7 +2829,8 @@ class ParticleMesh(object):
                 pos = pos.copy()
 
             for d in range(pos.shape[1]):
-                v.readout(pos, out=out_pos[:, d], resampler=resampler, transform=transform, gradient=d, layout=layout)
+                v.readout(pos, out=out_pos[:, d], resampler=resampler, transform=transform, gradient=d, layout=layout,
+                        plan=plan)
                 out_pos[..., d] *= mass
 
         if out_mass is not False:
@@ -1910,7 +2838,8 @@ class ParticleMesh(object):
                 out_mass = numpy.zeros(len(pos))
             if is_inplace(out_mass):
                 out_mass = mass
-            v.readout(pos, out=out_mass, resampler=resampler, transform=transform, gradient=gradient, layout=layout)
+            v.readout(pos, out=out_mass, resampler=resampler, transform=transform, gradient=gradient, layout=layout,
+                    plan=plan)
 
         return out_pos, out_mass
 
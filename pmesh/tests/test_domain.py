@@ -216,6 +216,28 @@ def test_exchange_smooth(comm):
     assert_array_equal(npos[0], [[0, 0], [0, 1], [1, 0], [1, 1]])
     assert_array_equal(npos[1], [[0, 0], [0, 1], [1, 0], [1, 1]])
 
+@MPITest(commsize=2)
+def test_exchange_smooth_per_particle(comm):
+    DomainGrid = [[0, 1, 2], [0, 2]]
+
+    dcop = domain.GridND(DomainGrid,
+            comm=comm,
+            periodic=True)
+
+    if comm.rank == 0:
+        pos = numpy.array([[0.5, 0.5], [0.5, 0.5]], dtype='f8')
+        smoothing = numpy.array([[0.1], [0.6]])
+    else:
+        pos = numpy.empty((0, 2), dtype='f8')
+        smoothing = numpy.empty((0, 1))
+
+    layout = dcop.decompose(pos, smoothing=smoothing)
+    nmass = numpy.ones(layout.newlength)
+
+    # only the second particle reaches the other domain
+    mass_sum = layout.gather(nmass, mode='sum')
+    assert_array_equal(mass_sum, [1, 2][:len(pos)])
+
 @MPITest(commsize=2)
 def test_isprimary(comm):
     DomainGrid = [[0, 1, 2], [0, 2]]
@@ -281,3 +303,31 @@ def test_loadbalance_degenerate(comm):
     dcop.loadbalance(domainload)
 
     assert not any(dcop.DomainAssign - [0, 1, 2])
+
+@MPITest(commsize=2)
+def test_exchange_reorder(comm):
+    DomainGrid = [[0, 1, 2], [0, 2]]
+
+    dcop = domain.GridND(DomainGrid,
+            comm=comm,
+            periodic=True)
+
+    if comm.rank == 0:
+        pos = numpy.array(list(numpy.ndindex((2, 2))), dtype='f8')
+        mass = [0, 1, 2, 3]
+    else:
+        pos = numpy.empty((0, 2), dtype='f8')
+        mass = []
+
+    layout = dcop.decompose(pos, smoothing=0)
+    layout.reorder([1, 0])
+
+    nmass = layout.exchange(mass)
+    mass2 = layout.gather(nmass)
+    mass3 = layout.gather(nmass, mode='local')
+    nmass = comm.allgather(nmass)
+
+    assert_array_equal(nmass[0], [1, 0])
+    assert_array_equal(nmass[1], [3, 2])
+    assert_array_equal(mass2, mass)
+    assert_array_equal(mass3, mass)
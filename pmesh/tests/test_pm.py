@@ -348,6 +348,263 @@ def test_untransposed_complex_apply(comm):
     for i, x, slab in zip(complex.slabs.i, complex.slabs.x, complex.slabs):
         assert_array_equal(slab, x[0] + x[1] * 1j + x[2])
 
+@MPITest(commsize=(1, 4))
+def test_apply_nslabs(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8')
+    real = pm.generate_whitenoise(seed=123, unitary=True, type='real')
+    complex = real.r2c()
+
+    def filter(x, v):
+        return v * (1 + x.normp(p=2, zeromode=1)) + x[0] * 10 + x[2]
+
+    def cfilter(w, v):
+        return v * (1 + sum(wi ** 2 for wi in w)) + w[1]
+
+    for field, kinds, f in [(real, ['relative', 'index'], filter),
+                            (complex, ['wavenumber', 'index'], filter),
+                            (complex, ['circular'], cfilter)]:
+        for kind in kinds:
+            r1 = field.apply(f, kind=kind)
+            for nslabs in [None, 3]:
+                r2 = field.apply(f, kind=kind, nslabs=nslabs)
+                assert_allclose(r2, r1)
+
+@MPITest(commsize=(1, 4))
+def test_get_kspace(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8')
+    complex = pm.create(type='complex', value=0)
+    k = complex.x
+    i = complex.i
+
+    assert_allclose(pm.get_kspace('k2') + complex.value.real, sum(ki ** 2 for ki in k))
+    assert_allclose(pm.get_kspace('knorm') + complex.value.real, sum(ki ** 2 for ki in k) ** 0.5)
+    assert pm.get_kspace('k2') is pm.get_kspace('k2')
+    assert not pm.get_kspace('k2').flags.writeable
+
+    selfconj = pm.get_kspace('selfconj')
+    assert selfconj.shape == complex.value.shape
+    assert_array_equal(selfconj, numpy.all([(n - ii) % n == ii + 0 * complex.value.real
+            for ii, n in zip(i, pm.Nmesh)], axis=0))
+
+    with pytest.raises(ValueError):
+        pm.get_kspace('unknown')
+    with pytest.raises(TypeError):
+        pm.get_kspace('k2', type='real')
+
+    # eviction keeps the cache bounded
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8')
+    pm.kspace_cache_nbytes = selfconj.nbytes * 9
+    k2 = pm.get_kspace('k2')
+    knorm = pm.get_kspace('knorm')
+    assert pm._kspace_nbytes <= pm.kspace_cache_nbytes
+    assert pm.get_kspace('knorm') is knorm
+    assert pm.get_kspace('k2') is not k2
+    assert_allclose(pm.get_kspace('k2'), knorm ** 2)
+
+@MPITest(commsize=(1, 4))
+def test_pipe(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8')
+    complex = pm.generate_whitenoise(seed=123, unitary=True, type='complex')
+
+    def f1(k, v): return v * k.normp(zeromode=1)
+    def f2(k, v): return v + k[0] * 1j
+
+    r1 = complex.apply(f1).apply(f2)
+    assert_allclose(complex.pipe(f1, f2), r1)
+    assert_allclose(complex.pipe(f1, f2, nslabs=None), r1)
+
+    real = pm.create(type='real')
+    r = complex.pipe(f1, f2, out=real)
+    assert r is real
+    assert_allclose(real, r1.c2r())
+
+    real = pm.create(type='real')
+    complex = complex.cast(type='untransposedcomplex')
+    assert_allclose(complex.pipe(f1, f2, out=real), r1.c2r())
+
+    with pytest.raises(TypeError):
+        complex.pipe(f1, bad=True)
+
+@MPITest(commsize=(1, 4))
+def test_pool(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8')
+    pm.enable_pool(2)
+
+    real = pm.create(type='real', value=1)
+    address = real._base.address
+    del real
+    # the buffer is recycled, by the real and transposed complex fields
+    real = pm.create(type='real', value=2)
+    assert real._base.address == address
+    value = real.value
+    del real
+    complex = pm.create(type='complex', value=0)
+    assert complex._base.address != address
+    assert_array_equal(value, 2)
+    del complex
+    complex = pm.create(type='complex')
+    assert pm.pool.nbuffers == 2
+
+    # a buffer shared with base= is in use until all its fields are gone
+    real = pm.create(type='real')
+    address = real._base.address
+    shared = pm.create(type='complex', base=real._base)
+    del real
+    assert pm.create(type='real')._base.address != address
+    del shared
+    assert pm.create(type='real')._base.address == address
+
+    # fields in reference cycles are recycled once collected
+    import gc
+    real = pm.create(type='real')
+    address = real._base.address
+    real.cycle = real
+    del real
+    gc.collect()
+    assert pm.create(type='real')._base.address == address
+
+    # beyond size, buffers are not pooled
+    fields = [pm.create(type='real') for i in range(4)]
+    assert pm.pool.nbuffers == 2
+
+    pm.enable_pool(0)
+    assert pm.pool is None
+
+    with pm.scratch() as pm1:
+        assert pm1 is pm
+        assert pm.pool is not None
+        complex = pm.generate_whitenoise(seed=123, type='complex')
+        r1 = complex.c2r().cnorm()
+        assert_allclose(complex.c2r().cnorm(), r1)
+
+    assert pm.pool is None
+
+@MPITest(commsize=(1, 4))
+def test_shared_coords(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8')
+    for type in ['real', 'complex', 'untransposedcomplex']:
+        f1 = pm.create(type=type)
+        f2 = pm.create(type=type)
+        assert f1.csize == comm.allreduce(f1.size)
+        for a, b, c in zip(f1.x + f1.i, f2.x + f2.i,
+                           pm.create_coords(type) + pm.create_coords(type, return_indices=True)):
+            assert a is b
+            assert not a.flags.writeable
+            assert_array_equal(a, c)
+
+@MPITest(commsize=(1, 4))
+def test_lazy(comm):
+    import pmesh.pm
+    from pmesh.pm import LazyField
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8')
+    a = pm.generate_whitenoise(seed=123, type='real')
+    b = pm.generate_whitenoise(seed=124, type='real')
+    x = a.x[0]
+
+    r1 = a * 2 + b * a - x
+    r = a.lazy() * 2 + b * a - x
+    assert isinstance(r, LazyField)
+    r2 = r.compute()
+    assert isinstance(r2, RealField)
+    assert_allclose(r2, r1)
+    assert r.compute() is r2
+
+    # blocks smaller than a slab and evaluating into an operand
+    block_nbytes = pmesh.pm.LAZY_BLOCK_NBYTES
+    pmesh.pm.LAZY_BLOCK_NBYTES = 1
+    try:
+        c = a.copy()
+        assert (c.lazy() * 2 + b * c - x).compute(out=c) is c
+    finally:
+        pmesh.pm.LAZY_BLOCK_NBYTES = block_nbytes
+    assert_allclose(c, r1)
+
+    mask = (a.lazy() > b).compute()
+    assert mask.dtype == numpy.dtype('?')
+    assert_array_equal(mask, a.value > b.value)
+
+    with pm.lazy():
+        ck = a.r2c()
+        r = ck * 2 - ck * 1j
+        assert isinstance(r, LazyField)
+        # attributes are taken from the computed field
+        assert_allclose(r.c2r(), (a.r2c() * (2 - 1j)).c2r())
+        assert_allclose(r.cnorm(), (a.r2c() * (2 - 1j)).cnorm())
+
+    assert isinstance(a * 2, RealField)
+
+@MPITest(commsize=(1, 4))
+def test_pending_scale(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8')
+    real = pm.generate_whitenoise(seed=123, type='real') + 1.0
+    truth = real.r2c().value.copy()
+
+    # the normalization is pending until the value is accessed
+    complex = real.r2c()
+    assert complex._scale == 1.0 / pm.Nmesh.prod()
+    assert_allclose(complex.c2r()._scale, complex._scale)
+    assert_allclose(complex.c2r(), real)
+    assert_allclose(complex.apply(lambda k, v: v * 2), truth * 2)
+    assert_allclose(complex.cnorm(), pm.create(type='complex', value=truth).cnorm())
+    assert_allclose(complex.c2r().csum(), real.csum())
+    assert_allclose(complex.c2r().cnorm(), real.cnorm())
+    assert complex._scale != 1.0
+    assert_allclose(complex.value, truth)
+    assert complex._scale == 1.0
+
+    # applied in place and by transforms into the same buffer
+    complex = real.r2c()
+    complex.apply(lambda k, v: v, out=Ellipsis)
+    assert complex._scale == 1.0
+    assert_allclose(complex, truth)
+
+    complex = real.r2c()
+    r = complex.c2r(out=Ellipsis)
+    assert r._base in complex._base
+    assert_allclose(r, real)
+
+    r = real.copy()
+    assert_allclose(r.r2c(out=Ellipsis), truth)
+
+    # the slabs keep their attributes
+    complex = real.r2c()
+    assert_allclose(complex.apply(lambda k, v: v * v.BoxSize[0] + v.i[0]),
+                    truth * 8.0 + pm.create(type='complex', value=truth).apply(lambda k, v: v.i[0]))
+    assert_allclose(complex.apply(lambda k, v: v * v.Nmesh[0], nslabs=None), truth * 8)
+
+    # views of an existing output or of the input are never stale
+    complex = pm.create(type='complex', value=0)
+    view = complex.value
+    real.r2c(out=complex)
+    assert_allclose(view, truth)
+
+    r = real.copy()
+    view = r.value
+    c = r.r2c(out=Ellipsis)
+    assert c._scale == 1.0
+    assert_allclose(c, truth)
+
+    # sharing the buffer applies the pending scale
+    complex = real.r2c()
+    shared = pm.create(type='complex', base=complex._base)
+    assert_allclose(shared, truth)
+
+@MPITest(commsize=(1, 4))
+def test_lazy_plans(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 14], comm=comm, dtype='f8')
+    assert 'forwardT' not in pm.plans
+    real = pm.generate_whitenoise(seed=123, type='real')
+    complex = real.r2c()
+    assert 'forwardT' in pm.plans
+    assert 'backwardT' in pm.plans
+    assert 'forwardU' not in pm.plans
+    assert 'ipforwardT' not in pm.plans
+    assert_allclose(complex.c2r(out=Ellipsis), real)
+    assert 'ipbackwardT' in pm.plans
+
+    with pytest.raises(KeyError):
+        pm.plans['unknown']
+
 @MPITest(commsize=(1,))
 def test_reshape(comm):
     pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8', np=[1, 1])
@@ -863,3 +1120,224 @@ def test_leak(comm):
         obj = ParticleMesh(BoxSize=8.0, Nmesh=[128, 128, 128], comm=comm, dtype='f8')
         del obj
         assert len(_pm_cache) == 1
+
+@MPITest(commsize=(1, 4))
+def test_template_cache(comm):
+    import pmesh.pm
+    from mpi4py import MPI
+    from pmesh.pm import _pm_cache, clear_cache
+    clear_cache(comm)
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8')
+
+    # templates are shared regardless of BoxSize and kept after the pm is gone
+    template = pm.template
+    assert pm.reshape(BoxSize=4.0).template is template
+    del pm
+    pm = ParticleMesh(BoxSize=2.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8', resampler='tsc')
+    assert pm.template is template
+
+    cache_size = pmesh.pm.PM_CACHE_SIZE
+    pmesh.pm.PM_CACHE_SIZE = 2
+    try:
+        pm4 = ParticleMesh(BoxSize=8.0, Nmesh=[4, 4, 4], comm=comm, dtype='f8')
+        pm8 = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8')
+        assert pm8.template is template
+        # evicts the least recently used [4, 4, 4]
+        pm6 = ParticleMesh(BoxSize=8.0, Nmesh=[6, 6, 6], comm=comm, dtype='f8')
+        assert len(_pm_cache.comms[_pm_cache._id(comm)]) == 2
+        assert ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8').template is template
+        assert ParticleMesh(BoxSize=8.0, Nmesh=[4, 4, 4], comm=comm, dtype='f8').template is not pm4.template
+    finally:
+        pmesh.pm.PM_CACHE_SIZE = cache_size
+
+    clear_cache(comm)
+    assert _pm_cache._id(comm) not in _pm_cache.comms
+    assert ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8').template is not template
+
+@MPITest(commsize=(1, 4))
+def test_template_cache_free(comm):
+    from pmesh.pm import _pm_cache
+    nentries = len(_pm_cache)
+
+    # the entries of a communicator are dropped when it is freed
+    for i in range(4):
+        subcomm = comm.Split(comm.rank % 2, comm.rank)
+        pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=subcomm, dtype='f8')
+        pm.create(type='real', value=1).r2c()
+        assert len(_pm_cache) == nentries + 1
+        assert pm.template is ParticleMesh(BoxSize=4.0, Nmesh=[8, 8, 8], comm=subcomm).template
+        del pm
+        subcomm.Free()
+        assert len(_pm_cache) == nentries
+
+@MPITest(commsize=(1, 4))
+def test_paint_many(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8')
+    numpy.random.seed(1234 + comm.rank)
+    pos = numpy.random.uniform(0, 8.0, size=(100, 3))
+    mass = numpy.random.uniform(size=(100, 3))
+    layout = pm.decompose(pos)
+
+    reals = pm.paint(pos, mass=mass, layout=layout)
+    assert len(reals) == 3
+    for i in range(3):
+        real = pm.paint(pos, mass=mass[:, i], layout=layout)
+        assert_allclose(reals[i], real)
+
+    out = [pm.create(type='real', value=1.0) for i in range(3)]
+    reals = pm.paint(pos, mass=mass, layout=layout, out=out, hold=True)
+    assert reals[0] is out[0]
+    for i in range(3):
+        real = pm.paint(pos, mass=mass[:, i], layout=layout)
+        assert_allclose(reals[i], real + 1.0)
+
+@MPITest(commsize=(1, 4))
+def test_readout_many(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8')
+    numpy.random.seed(1234 + comm.rank)
+    pos = numpy.random.uniform(0, 8.0, size=(100, 3))
+    layout = pm.decompose(pos)
+
+    fields = [pm.generate_whitenoise(seed=i, unitary=True).c2r() for i in range(3)]
+    v = pm.readout_many(fields, pos, layout=layout)
+    assert v.shape == (100, 3)
+    for i in range(3):
+        assert_allclose(v[:, i], fields[i].readout(pos, layout=layout))
+
+@MPITest(commsize=(1, 4))
+def test_resample_plan(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8')
+    numpy.random.seed(1234 + comm.rank)
+    pos = numpy.random.uniform(0, 8.0, size=(100, 3))
+    mass = numpy.random.uniform(size=100)
+    layout = pm.decompose(pos)
+
+    plan = pm.resample_plan(pos, layout=layout, derivative=True)
+
+    real = pm.paint(pos, mass=mass, layout=layout)
+    assert_allclose(pm.paint(pos, mass=mass, plan=plan), real)
+
+    for gradient in [None, 1]:
+        assert_allclose(real.readout(pos, plan=plan, gradient=gradient),
+                        real.readout(pos, layout=layout, gradient=gradient))
+
+    v = numpy.random.uniform(size=100)
+    out_self, out_pos = real.readout_vjp(pos, v, layout=layout)
+    out_self2, out_pos2 = real.readout_vjp(pos, v, plan=plan)
+    assert_allclose(out_self, out_self2)
+    assert_allclose(out_pos, out_pos2)
+
+@MPITest(commsize=(1, 4))
+def test_decompose_morton(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8')
+    numpy.random.seed(1234 + comm.rank)
+    pos = numpy.random.uniform(0, 8.0, size=(100, 3))
+    mass = numpy.random.uniform(size=100)
+
+    layout = pm.decompose(pos)
+    mlayout = pm.decompose(pos, order='morton')
+    assert_array_equal(numpy.sort(mlayout.order), numpy.arange(mlayout.newlength))
+    # keys routed by the layout sort the same as the delievered positions
+    assert_array_equal(mlayout.order, pm.sfc_argsort(layout.exchange(pos)))
+
+    # consecutive particles are close along the curve
+    x = mlayout.exchange(pos)
+    cell = numpy.int64(x)
+    assert (numpy.abs(numpy.diff(cell, axis=0)).sum(axis=-1) <= 3).mean() > 0.5
+
+    real = pm.paint(pos, mass=mass, layout=layout)
+    assert_allclose(pm.paint(pos, mass=mass, layout=mlayout), real)
+    assert_allclose(real.readout(pos, layout=mlayout), real.readout(pos, layout=layout))
+
+    # reuse of a previous order
+    layout2 = pm.decompose(pos, order=mlayout.order)
+    assert_array_equal(layout2.order, mlayout.order)
+    layout3 = pm.decompose(pos[:50], order=mlayout.order)
+    assert len(layout3.order) == layout3.newlength
+
+@MPITest(commsize=(1, 4))
+def test_decompose_hsml(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8')
+    numpy.random.seed(1234 + comm.rank)
+    pos = numpy.random.uniform(0, 8.0, size=(100, 3))
+    hsml = numpy.random.choice([0.5, 1.0, 2.0], size=100)
+
+    all_pos = numpy.concatenate(comm.allgather(pos), axis=0)
+    all_hsml = numpy.concatenate(comm.allgather(hsml), axis=0)
+
+    for resampler in ['cic', 'lanczos2']:
+        truth = numpy.zeros(pm.Nmesh, dtype='f8')
+        window.FindResampler(resampler).paint(truth, all_pos, hsml=all_hsml,
+            transform=window.Affine(ndim=3, period=8))
+
+        layout = pm.decompose(pos, smoothing=resampler, hsml=hsml)
+        real = pm.paint(pos, hsml=hsml, resampler=resampler, layout=layout)
+        assert_allclose(real.value, truth[real.slices], atol=1e-10)
+
+        # fewer copies than a uniform margin for the widest particle
+        wide = pm.decompose(pos, smoothing=window.FindResampler(resampler).support * 1.0)
+        assert layout.newlength <= wide.newlength
+
+@MPITest(commsize=(1, 4))
+def test_r2c_compensation(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 4], comm=comm, dtype='f8', resampler='tsc')
+    real = pm.generate_whitenoise(seed=123, type='real')
+
+    for resampler in ['cic', 'tsc', window.FindResampler('pcs')]:
+        truth = real.r2c().apply(window.FindResampler(resampler).get_compensation(), kind='circular')
+        assert_allclose(real.r2c(compensation=resampler), truth, rtol=1e-10)
+
+        out = pm.create(type='untransposedcomplex')
+        truth = real.r2c(out=out).apply(window.FindResampler(resampler).get_compensation(), kind='circular')
+        assert_allclose(real.r2c(out=pm.create(type='untransposedcomplex'), compensation=resampler), truth, rtol=1e-10)
+
+    # default resampler of pm
+    truth = real.r2c().apply(window.FindResampler('tsc').get_compensation(), kind='circular')
+    assert_allclose(real.r2c(compensation=True), truth, rtol=1e-10)
+
+    # tables are cached
+    assert pm._get_fwindow('tsc', 'complex') is pm._get_fwindow('tsc', 'complex')
+
+@MPITest(commsize=(1, 4))
+def test_paint_interlaced(comm):
+    pm = ParticleMesh(BoxSize=8.0, Nmesh=[8, 8, 8], comm=comm, dtype='f8')
+    numpy.random.seed(1234 + comm.rank)
+    pos = numpy.random.uniform(0, 8.0, size=(100, 3))
+    mass = numpy.random.uniform(size=100)
+
+    # half a cell of extra margin for the shifted mesh
+    layout = pm.decompose(pos, smoothing=pm.resampler.support * 0.5 + 0.5)
+    c = pm.paint_interlaced(pos, mass=mass, layout=layout, compensation=True)
+
+    # by hand
+    r1 = pm.paint(pos, mass=mass, layout=layout)
+    r2 = pm.paint(pos, mass=mass, layout=layout, transform=pm.affine.shift(0.5))
+    c1 = r1.r2c().apply(pm.resampler.get_compensation(), kind='circular')
+    c2 = r2.r2c().apply(pm.resampler.get_compensation(), kind='circular')
+    H = pm.BoxSize / pm.Nmesh
+    for k, s1, s2 in zip(c1.slabs.x, c1.slabs, c2.slabs):
+        kH = sum(k[i] * H[i] for i in range(3))
+        s1[...] = s1 * 0.5 + s2 * 0.5 * numpy.exp(0.5j * kH)
+    assert_allclose(c, c1, atol=1e-10)
+
+    # the mass is conserved
+    assert_allclose(c.c2r().csum(), comm.allreduce(mass.sum()), rtol=1e-8)
+
+    # closer to the exact Fourier sum over the particles than plain paint,
+    # below half of the Nyquist, where aliasing dominates the error.
+    p = pm.paint(pos, mass=mass, layout=layout).r2c(compensation=True)
+    allpos = numpy.concatenate(comm.allgather(pos))
+    allmass = numpy.concatenate(comm.allgather(mass))
+    kmax = 0.5 * numpy.pi / H.max()
+    err = numpy.zeros(3)
+    for k, s1, s2 in zip(c.slabs.x, c.slabs, p.slabs):
+        kx = sum(k[i][..., None] * allpos[:, i] for i in range(3))
+        truth = (allmass * numpy.exp(-1j * kx)).sum(axis=-1) / pm.Nmesh.prod()
+        low = sum(ki ** 2 for ki in k) < kmax ** 2
+        err += [(abs(s1 - truth) ** 2 * low).sum(),
+                (abs(s2 - truth) ** 2 * low).sum(),
+                (abs(truth) ** 2 * low).sum()]
+    err = comm.allreduce(err)
+    err_interlaced, err_plain = (err[:2] / err[2]) ** 0.5
+    assert err_interlaced < 0.5 * err_plain
+    assert err_interlaced < 1e-2
@@ -1,10 +1,11 @@
 from pmesh.window import ResampleWindow, Affine
-from pmesh.window import (CIC, LANCZOS2, LANCZOS3,
+from pmesh.window import _broadcast, _as_canvases
+from pmesh.window import (CIC, LANCZOS2, LANCZOS3, LANCZOS6, PCS,
                           TSC, QUADRATIC, CUBIC, ACG3,
                           DB12, DB20, LINEAR, NEAREST)
 
 import numpy
-from numpy.testing import assert_array_equal, assert_allclose, assert_almost_equal
+from numpy.testing import assert_array_equal, assert_allclose, assert_almost_equal, assert_raises
 from numpy.testing.decorators import skipif
 
 def test_unweighted():
@@ -285,6 +286,26 @@ def test_acg():
     assert_allclose(real, [ 0.  ,       0.21347228, 0.52014034 ,0.30805789 ])
 
 
+def test_separable():
+    # the generic loops are specialized per dimension; check them against
+    # the outer product of 1d paints, with wrapping and partial canvases.
+    for window, Nmesh, size in [(LANCZOS3, 6, 5), (ACG3, 6, 5), (LANCZOS6, 16, 16), (LANCZOS6, 16, 7)]:
+        for ndim in [1, 2, 3, 4]:
+            affine = Affine(ndim=ndim, period=Nmesh, translate=-1)
+            pos = numpy.array([[0.3, 5.7, 2.5, 1.1][:ndim]])
+            real = numpy.zeros([size] * ndim)
+            window.paint(real, pos, transform=affine)
+
+            expected = numpy.ones([])
+            for d in range(ndim):
+                r1 = numpy.zeros(size)
+                window.paint(r1, pos[:, d:d+1], transform=Affine(ndim=1, period=Nmesh, translate=-1))
+                expected = numpy.multiply.outer(expected, r1)
+            assert_allclose(real, expected, atol=1e-12)
+
+            value = window.readout(real, pos, transform=affine)
+            assert_allclose(value, (expected ** 2).sum(), atol=1e-12)
+
 @skipif(True, "numerical details of wavelets undecided")
 def test_db12():
     real = numpy.zeros((10))
@@ -363,3 +384,198 @@ def test_compensation():
     comp1 = CIC.get_fwindow([0, 2 * numpy.pi])
 
     assert_allclose(comp1, [1, 0.0], atol=1e-9)
+
+def test_paint_threads():
+    affine = Affine(ndim=3, period=[32, 32, 32])
+    numpy.random.seed(1234)
+    pos = numpy.random.uniform(-4, 36, size=(10000, 3))
+    mass = numpy.random.uniform(size=10000)
+
+    for window in [CIC, TSC, LANCZOS2]:
+        real = numpy.zeros((32, 32, 32))
+        window.paint(real, pos, mass=mass, transform=affine)
+        for strategy in ['tile', 'private']:
+            real2 = numpy.zeros((32, 32, 32))
+            window.paint(real2, pos, mass=mass, transform=affine, nthreads=4, strategy=strategy)
+            assert_allclose(real, real2)
+
+    # a partial canvas, as on a rank of a domain decomposition
+    affine = Affine(ndim=3, period=[32, 32, 32], translate=[-4, 0, 0])
+    real = numpy.zeros((24, 32, 32))
+    CIC.paint(real, pos, mass=mass, hsml=1.5, transform=affine)
+    real2 = numpy.zeros((24, 32, 32))
+    CIC.paint(real2, pos, mass=mass, hsml=1.5, transform=affine, nthreads=4)
+    assert_allclose(real, real2)
+
+def test_readout_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    affine = Affine(ndim=3, period=[16, 16, 16])
+    numpy.random.seed(1234)
+    field = numpy.random.uniform(size=(16, 16, 16))
+    pos = numpy.random.uniform(-4, 20, size=(10000, 3))
+
+    v = TSC.readout(field, pos, transform=affine)
+    v2 = TSC.readout(field, pos, transform=affine, nthreads=4)
+    assert_array_equal(v, v2)
+
+    with ThreadPoolExecutor(3) as executor:
+        results = executor.map(lambda d: TSC.readout(field, pos, transform=affine, diffdir=d), range(3))
+        for d, r in enumerate(results):
+            assert_array_equal(r, TSC.readout(field, pos, transform=affine, diffdir=d))
+
+def test_paint_many():
+    affine = Affine(ndim=3, period=[16, 16, 16])
+    numpy.random.seed(1234)
+    pos = numpy.random.uniform(-4, 20, size=(1000, 3))
+    mass = numpy.random.uniform(size=(1000, 4))
+
+    for window in [CIC, TSC, LANCZOS2]:
+        reals = [numpy.zeros((16, 16, 16)) for i in range(4)]
+        window.paint(reals, pos, mass=mass, transform=affine)
+        for i in range(4):
+            real = numpy.zeros((16, 16, 16))
+            window.paint(real, pos, mass=mass[:, i], transform=affine)
+            assert_allclose(reals[i], real)
+
+        reals2 = [numpy.zeros((16, 16, 16)) for i in range(4)]
+        window.paint(reals2, pos, mass=mass, transform=affine, nthreads=4, strategy='private')
+        for i in range(4):
+            assert_allclose(reals[i], reals2[i])
+
+    # scalar mass is broadcast to all fields.
+    reals = [numpy.zeros((16, 16, 16)) for i in range(2)]
+    CIC.paint(reals, pos, mass=2.0, transform=affine, diffdir=0)
+    real = numpy.zeros((16, 16, 16))
+    CIC.paint(real, pos, mass=2.0, transform=affine, diffdir=0)
+    assert_allclose(reals[0], real)
+    assert_allclose(reals[1], real)
+
+def test_readout_many():
+    affine = Affine(ndim=3, period=[16, 16, 16])
+    numpy.random.seed(1234)
+    fields = [numpy.random.uniform(size=(16, 16, 16)) for i in range(3)]
+    pos = numpy.random.uniform(-4, 20, size=(1000, 3))
+
+    for window in [CIC, TSC, PCS, LANCZOS2]:
+        v = window.readout(fields, pos, transform=affine)
+        assert v.shape == (1000, 3)
+        for i in range(3):
+            assert_allclose(v[:, i], window.readout(fields[i], pos, transform=affine))
+
+        v2 = window.readout(fields, pos, transform=affine, nthreads=4, diffdir=1)
+        for i in range(3):
+            assert_allclose(v2[:, i], window.readout(fields[i], pos, transform=affine, diffdir=1))
+
+def test_plan():
+    affine = Affine(ndim=3, period=[16, 16, 16])
+    numpy.random.seed(1234)
+    pos = numpy.random.uniform(-4, 20, size=(1000, 3))
+    mass = numpy.random.uniform(size=1000)
+    hsml = numpy.random.uniform(0.5, 2.0, size=1000)
+    field = numpy.random.uniform(size=(16, 16, 16))
+
+    for window in [CIC, TSC, LANCZOS2]:
+        for h in [None, hsml]:
+            plan = window.plan(pos, hsml=h, transform=affine, derivative=True)
+            for diffdir in [None, 0, 2]:
+                real = numpy.zeros((16, 16, 16))
+                window.paint(real, pos, hsml=h, mass=mass, transform=affine, diffdir=diffdir)
+                real2 = numpy.zeros((16, 16, 16))
+                plan.paint(real2, mass=mass, diffdir=diffdir)
+                assert_allclose(real, real2, atol=1e-10)
+
+                v = window.readout(field, pos, hsml=h, transform=affine, diffdir=diffdir)
+                assert_allclose(plan.readout(field, diffdir=diffdir, nthreads=4), v, atol=1e-10)
+
+    # threaded painting; the canvas is wide enough to be tiled.
+    pos32 = numpy.random.uniform(-4, 36, size=(10000, 3))
+    mass32 = numpy.random.uniform(size=10000)
+    for translate in [[0, 0, 0], [-4, 0, 0]]:
+        affine32 = Affine(ndim=3, period=[32, 32, 32], translate=translate)
+        shape = (32 + translate[0] * 2, 32, 32)
+        for window in [CIC, TSC]:
+            plan = window.plan(pos32, transform=affine32, derivative=True)
+            for diffdir in [None, 1]:
+                real = numpy.zeros(shape)
+                plan.paint(real, mass=mass32, diffdir=diffdir)
+                for strategy in ['tile', 'private']:
+                    real2 = numpy.zeros(shape)
+                    plan.paint(real2, mass=mass32, diffdir=diffdir, nthreads=4, strategy=strategy)
+                    assert_allclose(real, real2, atol=1e-10)
+
+    # single precision weights
+    plan = CIC.plan(pos, transform=affine, dtype='f4')
+    assert plan.k.dtype == numpy.float32
+    v = CIC.readout(field, pos, transform=affine)
+    assert_allclose(plan.readout(field), v, rtol=1e-5)
+
+    # no derivative weights
+    assert_raises(ValueError, plan.readout, field, diffdir=0)
+
+def test_readonly():
+    pos = numpy.random.uniform(size=(100, 3)) * 8
+    mass = numpy.random.uniform(size=100)
+    real = numpy.zeros((8, 8, 8))
+    CIC.paint(real, pos, mass=mass)
+
+    pos.setflags(write=False)
+    mass.setflags(write=False)
+    real2 = numpy.zeros((8, 8, 8))
+    CIC.paint(real2, pos, mass=mass)
+    assert_allclose(real, real2)
+
+    # scalar mass and hsml are broadcast, not copied
+    real3 = numpy.zeros((8, 8, 8))
+    CIC.paint(real3, pos, mass=2.0, hsml=1.0)
+    real4 = numpy.zeros((8, 8, 8))
+    CIC.paint(real4, pos, mass=numpy.ones(100) * 2)
+    assert_allclose(real3, real4)
+
+    # attributes and canvases are used in place
+    assert numpy.shares_memory(_broadcast(mass, 100), mass)
+    assert _broadcast(2.0, (100, 3)).strides == (0, 0)
+    big = numpy.broadcast_to(numpy.float64(2.0), 10 ** 8)
+    assert numpy.shares_memory(_broadcast(big, 10 ** 8), big)
+    cplx = numpy.zeros((8, 8, 8), dtype='c16')
+    reals, nfields = _as_canvases([real, cplx])
+    assert reals[0] is real
+    assert numpy.shares_memory(reals[1], cplx)
+    assert nfields == 2
+
+    v = CIC.readout(real, pos)
+    v4 = CIC.readout(real, pos, dtype='f4')
+    assert v4.dtype == numpy.float32
+    assert_allclose(v, v4, rtol=1e-5)
+
+def test_chunks():
+    # particles are painted in chunks; the tail of a partial chunk must not be lost.
+    pos = numpy.random.uniform(size=(37, 2)) * 8
+    mass = numpy.random.uniform(size=37)
+    for window in [CIC, LANCZOS2]:
+        for hsml in [None, 1.0]:
+            real = numpy.zeros((8, 8))
+            window.paint(real, pos, hsml=hsml, mass=mass)
+            real1 = numpy.zeros((8, 8))
+            for i in range(len(pos)):
+                window.paint(real1, pos[i:i+1], hsml=hsml, mass=mass[i:i+1])
+            assert_allclose(real, real1)
+            value = window.readout(real, pos, hsml=hsml)
+            value1 = [window.readout(real, pos[i:i+1], hsml=hsml)[0] for i in range(len(pos))]
+            assert_allclose(value, value1)
+
+def test_hsml_buckets():
+    pos = numpy.random.uniform(size=(50, 3)) * 8
+    hsml = numpy.random.choice([0.4, 0.9, 1.0, 1.3, 2.0], size=50)
+    affine = Affine(ndim=3, period=8)
+    for window in [CIC, TSC, LANCZOS2]:
+        assert_array_equal(window.get_support(hsml), numpy.ceil(window.support * hsml))
+        real = numpy.zeros((8, 8, 8))
+        window.paint(real, pos, hsml=hsml, transform=affine, nthreads=2)
+        real1 = numpy.zeros((8, 8, 8))
+        for i in range(len(pos)):
+            window.paint(real1, pos[i:i+1], hsml=hsml[i:i+1], transform=affine)
+        assert_allclose(real, real1, atol=1e-12)
+
+        value = window.readout(real, pos, hsml=hsml, transform=affine)
+        value1 = [window.readout(real, pos[i:i+1], hsml=hsml[i:i+1], transform=affine)[0] for i in range(len(pos))]
+        assert_allclose(value, value1, atol=1e-12)
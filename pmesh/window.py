@@ -15,6 +15,32 @@ def _mkarr(var, shape, dtype):
         r[...] = var
         return r
 
+def _broadcast(var, shape):
+    """ Broadcast a per particle attribute to shape without copying;
+        scalars and broadcast axes get a stride of zero.
+    """
+    var = numpy.asfarray(var)
+    if numpy.isscalar(shape):
+        shape = (int(shape),)
+    shape = tuple(shape)
+    if var.shape == shape:
+        return var
+    return numpy.broadcast_to(var, shape)
+
+def _as_canvases(real):
+    """ Returns a list of real canvases, and the number of fields
+        (None if real is a single array).
+    """
+    if isinstance(real, (list, tuple)):
+        reals = list(real)
+        nfields = len(reals)
+    else:
+        reals = [real]
+        nfields = None
+
+    reals = [r.real if numpy.iscomplexobj(r) else r for r in reals]
+    return reals, nfields
+
 class Affine(object):
     """ Defines an affine Transformation, used by ResampleWindow.
 
@@ -62,6 +88,56 @@ class ResampleWindow(_ResampleWindow):
         """ Change the support of the window, returning a new window. """
         return ResampleWindow(self.kind, support)
 
+    def get_support(self, hsml):
+        """
+            The integer support of the window in grid units, for each particle.
+
+            Parameters
+            ----------
+            hsml : array_like
+                scaling of the kernel. it is dimensionless.
+
+            Returns
+            -------
+            support : array_like
+                self.support * hsml, rounded up to an integer.
+        """
+        s = self.support * numpy.asfarray(hsml)
+        return numpy.where(s > 0, numpy.ceil(s), self.nativesupport).astype('intp')
+
+    def _buckets(self, hsml, ndim):
+        """ Group particles by the integer support of their window.
+
+            Returns a list of (index, hsml, hsmlmax) per group; index is None for all particles.
+            The tuned kernels do not scale with hsml, thus hsml is dropped for the
+            group at their native support, which then skips the per particle dispatch.
+        """
+        if hsml is None:
+            return [(None, None, 1.0)]
+
+        tuned = isinstance(self.kind, str) and self.kind.startswith('tuned') and ndim <= 3
+
+        if len(hsml) == 0 or hsml.strides[0] == 0:
+            # a single bucket
+            support = self.get_support(hsml[:1])
+            arg = numpy.empty(0, dtype='intp')
+            bounds = [0, len(hsml)]
+        else:
+            support = self.get_support(hsml)
+            arg = numpy.argsort(support, kind='stable')
+            support = support[arg]
+            bounds = [0] + list(numpy.flatnonzero(numpy.diff(support)) + 1) + [len(hsml)]
+
+        buckets = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            s = support[start] if len(support) > 0 else self.support
+            index = None if len(bounds) == 2 else arg[start:end]
+            if tuned and s == self.support:
+                buckets.append((index, None, 1.0))
+            else:
+                buckets.append((index, hsml, max(s * 1.0 / self.support, 1.0)))
+        return buckets
+
     def get_compensation(self):
         """
             Return a function that compensates the resampling window by
@@ -103,22 +179,51 @@ class ResampleWindow(_ResampleWindow):
         T = _ResampleWindow.get_fwindow(self, w1d)
         return T.reshape(numpy.shape(w))
 
-    def paint(self, real, pos, hsml=None, mass=None, diffdir=None, transform=None):
+    def plan(self, pos, hsml=None, transform=None, derivative=False, dtype='f8', nthreads=1):
+        """
+            Create a :py:class:`ResamplePlan` that caches the base cells and the 1d
+            kernel weights of the particles.
+
+            Parameters
+            ----------
+            pos : array_like
+
+            hsml: array_like or None
+                scaling of the kernel. it is dimensionless; None for no scaling
+
+            transform: Affine
+                The Affine transformation from position to grid units.
+
+            derivative : bool
+                if True, also cache the weights for the derivative of the kernel
+                (diffdir in paint and readout).
+
+            dtype : dtype
+                'f4' to store the weights in single precision, halving the memory.
+
+        """
+        return ResamplePlan(self, pos, hsml=hsml, transform=transform, derivative=derivative, dtype=dtype, nthreads=nthreads)
+
+    def paint(self, real, pos, hsml=None, mass=None, diffdir=None, transform=None, nthreads=1, strategy='tile'):
         """
             paint to a field.
 
             Parameters
             ----------
-            real : array_like
-                original values are preserved.
+            real : array_like, or list of array_like
+                original values are preserved. If a list is given, the
+                fields are painted together, such that the kernel is only
+                evaluated once per particle. The fields must share the
+                shape, strides and dtype.
 
             pos : array_like
 
             mass : array_like or None
-                None for 1
+                None for 1. If real is a list, shall be of shape (N, len(real)).
 
             hsml: array_like or None
                 scaling of the kernel. it is dimensionless; None for no scaling (default kernel support in grid units)
+                Particles are painted in groups of the same integer support (:py:meth:`get_support`).
 
             diffdir: int or None
                 direction for differentiation kernel.
@@ -127,7 +232,20 @@ class ResampleWindow(_ResampleWindow):
             transform: Affine
                 The Affine transformation from position to grid units.
 
+            nthreads: int
+                number of OpenMP threads used for painting.
+
+            strategy: string
+                how threads avoid writing to the same cell.
+                'tile' cuts the canvas into tiles along the first axis; even and
+                odd tiles are painted in two passes.
+                'private' paints to a private canvas per thread and sums them up at the end;
+                this uses nthreads times the memory of the canvas.
+
         """
+        reals, nfields = _as_canvases(real)
+        real = reals[0]
+
         if transform is None:
             transform = Affine(real.ndim)
 
@@ -137,38 +255,34 @@ class ResampleWindow(_ResampleWindow):
         if diffdir is not None:
             order[diffdir] = 1
 
+        # no copies are made; read-only and broadcast arrays are passed as is.
         pos = numpy.asfarray(pos)
         if mass is None:
-            mass = numpy.array(1.0, 'f8')
-        else:
-            mass = numpy.asfarray(mass)
-
-        mass = _mkarr(mass, len(pos), mass.dtype)
-        # workaround https://github.com/cython/cython/issues/1605
+            mass = 1.0
 
-        if not pos.flags.writeable:
-            pos = pos.copy()
-        if not mass.flags.writeable:
-            mass = mass.copy()
+        if nfields is None:
+            mass = _broadcast(mass, len(pos))[:, None]
+        else:
+            mass = _broadcast(mass, (len(pos), nfields))
 
         if hsml is not None:
-            hsml = numpy.asfarray(hsml)
-            hsml = _mkarr(hsml, len(pos), hsml.dtype)
-
-            if not hsml.flags.writeable:
-                hsml = hsml.copy()
+            hsml = _broadcast(hsml, len(pos))
 
-        if numpy.iscomplexobj(real):
-            real = real.real
-        _ResampleWindow.paint(self, real, pos, hsml, mass, order, transform.scale, transform.translate, transform.period)
+        # particles are painted in groups of the same integer support
+        for index, h, hsmlmax in self._buckets(hsml, real.ndim):
+            _ResampleWindow.paint(self, reals, pos, h, mass, order, transform.scale, transform.translate, transform.period,
+                nthreads, strategy, hsmlmax, index)
 
-    def readout(self, real, pos, hsml=None, out=None, diffdir=None, transform=None):
+    def readout(self, real, pos, hsml=None, out=None, diffdir=None, transform=None, nthreads=1, dtype='f8'):
         """
             readout from a field.
 
             Parameters
             ----------
-            real : array_like
+            real : array_like, or list of array_like
+                If a list is given, all fields are read out together,
+                such that the kernel is only evaluated once per particle.
+                The fields must share the shape, strides and dtype.
 
             pos : array_like
 
@@ -176,9 +290,7 @@ class ResampleWindow(_ResampleWindow):
                 scaling of the kernel. it is dimensionless; None for no scaling (default kernel support in grid units)
 
             out : array_like
-
-            mass : array_like or None
-                None for 1
+                of shape (N,), or (N, len(real)) if real is a list. float32 or float64.
 
             diffdir: int or None
                 direction for differentiation kernel.
@@ -187,7 +299,17 @@ class ResampleWindow(_ResampleWindow):
             transform: Affine
                 The Affine transformation from position to grid units.
 
+            nthreads: int
+                number of OpenMP threads used for the readout. The GIL is
+                released during the readout regardless.
+
+            dtype: dtype
+                dtype of out if out is None; 'f4' or 'f8'.
+
         """
+        reals, nfields = _as_canvases(real)
+        real = reals[0]
+
         if transform is None:
             transform = Affine(real.ndim)
 
@@ -199,25 +321,125 @@ class ResampleWindow(_ResampleWindow):
 
         pos = numpy.asfarray(pos)
         if out is None:
-            out = numpy.zeros(pos.shape[:-1], dtype='f8')
+            if nfields is None:
+                out = numpy.empty(pos.shape[:-1], dtype=dtype)
+            else:
+                out = numpy.empty((len(pos), nfields), dtype=dtype)
+
+        out2d = out[:, None] if nfields is None else out
 
-        # workaround https://github.com/cython/cython/issues/1605
+        if hsml is not None:
+            hsml = _broadcast(hsml, len(pos))
 
-        if not pos.flags.writeable:
-            pos = pos.copy()
+        for index, h, hsmlmax in self._buckets(hsml, real.ndim):
+            _ResampleWindow.readout(self, reals, pos, h, out2d, order, transform.scale, transform.translate, transform.period,
+                nthreads, index)
+
+        return out
 
+class ResamplePlan(object):
+    """ Cached base cells and 1d kernel weights of particles for a resample window.
+
+        Painting and reading out with a plan replays the cached weights, without
+        evaluating the window function again. Create a plan with :py:meth:`ResampleWindow.plan`.
+
+        The memory cost is `N * ndim * support` weights, twice as much with derivative.
+
+        Attributes
+        ----------
+        ipos : array_like (N, ndim)
+            the left most cell touched by each particle, in grid units, before wrapping.
+
+        k : array_like (N, ndim, support)
+            1d kernel weights of each particle.
+
+        dk : array_like (N, ndim, support) or None
+            1d weights of the derivative of the kernel; None if not computed.
+
+        layout : Layout or None
+            the layout the particles were routed with; only used by :py:class:`pmesh.pm.ParticleMesh`.
+    """
+    def __init__(self, window, pos, hsml=None, transform=None, derivative=False, dtype='f8', nthreads=1):
+        pos = numpy.asfarray(pos)
+        ndim = pos.shape[-1]
+        if transform is None:
+            transform = Affine(ndim)
+
+        assert isinstance(transform, Affine)
+
+        hsmlmax = 1.0
         if hsml is not None:
-            hsml = numpy.asfarray(hsml)
-            hsml = _mkarr(hsml, len(pos), hsml.dtype)
+            hsml = _broadcast(hsml, len(pos))
+            if len(hsml) > 0:
+                hsmlmax = max(hsml.max(), 1.0)
+
+        support = window.plan_support(hsmlmax)
+
+        self.window = window
+        self.transform = transform
+        self.ipos = numpy.empty((len(pos), ndim), dtype='i4')
+        self.k = numpy.empty((len(pos), ndim, support), dtype=dtype)
+
+        window.plan_fill(pos, hsml, 0, transform.scale, transform.translate, transform.period,
+                self.ipos, self.k, nthreads)
+
+        if derivative:
+            self.dk = numpy.empty_like(self.k)
+            window.plan_fill(pos, hsml, 1, transform.scale, transform.translate, transform.period,
+                    self.ipos, self.dk, nthreads)
+        else:
+            self.dk = None
+
+        self.layout = None
+
+    @property
+    def size(self):
+        return len(self.ipos)
 
-            if not hsml.flags.writeable:
-                hsml = hsml.copy()
+    def _weights(self, diffdir):
+        if diffdir is None:
+            return self.k, -1
+        if self.dk is None:
+            raise ValueError("the plan is created without derivative weights")
+        return self.dk, diffdir
 
-        if numpy.iscomplexobj(real):
-            real = real.real
+    def paint(self, real, mass=None, diffdir=None, nthreads=1, strategy='tile'):
+        """ paint to a field (or a list of fields); see :py:meth:`ResampleWindow.paint`.
+            The canvas shall be the same as when the plan is created.
+        """
+        reals, nfields = _as_canvases(real)
+
+        if mass is None:
+            mass = 1.0
+
+        if nfields is None:
+            mass = _broadcast(mass, self.size)[:, None]
+        else:
+            mass = _broadcast(mass, (self.size, nfields))
+
+        dk, diffdir = self._weights(diffdir)
+        transform = self.transform
+        self.window.plan_paint(reals, self.ipos, self.k, dk, diffdir, mass,
+                transform.scale, transform.translate, transform.period, nthreads, strategy)
+
+    def readout(self, real, out=None, diffdir=None, nthreads=1, dtype='f8'):
+        """ readout from a field (or a list of fields); see :py:meth:`ResampleWindow.readout`.
+            The canvas shall be the same as when the plan is created.
+        """
+        reals, nfields = _as_canvases(real)
+
+        if out is None:
+            if nfields is None:
+                out = numpy.empty(self.size, dtype=dtype)
+            else:
+                out = numpy.empty((self.size, nfields), dtype=dtype)
 
-        _ResampleWindow.readout(self, real, pos, hsml, out, order, transform.scale, transform.translate, transform.period)
+        out2d = out[:, None] if nfields is None else out
 
+        dk, diffdir = self._weights(diffdir)
+        transform = self.transform
+        self.window.plan_readout(reals, self.ipos, self.k, dk, diffdir, out2d,
+                transform.scale, transform.translate, transform.period, nthreads)
         return out
 
 def FindResampler(window):
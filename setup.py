@@ -27,6 +27,8 @@ extensions = [
                          "pmesh/_window_lanczos.h",
                          "pmesh/_window_acg.h"],
                 libraries = ['m'],
+                extra_compile_args=['-fopenmp'],
+                extra_link_args=['-fopenmp'],
                 include_dirs=["./", numpy.get_include()]),
         Extension("pmesh._invariant", ["pmesh/_invariant.pyx"],
                 depends=["pmesh/_invariant_imp.c",